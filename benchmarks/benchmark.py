@@ -0,0 +1,233 @@
+import os
+import sys
+import json
+import time
+import timeit
+import argparse
+import platform
+import tempfile
+import subprocess
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'spacecraft-temp'))
+sys.path.insert(0, os.path.join(ROOT, 'n-body-problem'))
+
+from synthetic import *
+
+DEFAULT_HISTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'history.jsonl')
+
+# Sizes of workloads, quick runs are used to check that benchmarks work
+SIZES = {
+    'full': {'parse': [10, 100, 1000], 'rhs': [10, 100, 1000], 'solve': [10, 100], 'nbody': [100, 200], 'kernel': [1000, 4000], 
+             'barnes_hut': [10000, 100000]},
+    'quick': {'parse': [10, 100], 'rhs': [10, 100], 'solve': [10], 'nbody': [50], 'kernel': [500], 'barnes_hut': [2000]}
+}
+
+# Value of A in heat flux expressions used by the GUI
+A = 50
+
+def measure(func, repeat=5, min_time=0.2) -> dict:
+    """
+    Time func after a warm-up call, the number of calls per measurement is chosen 
+    so that a measurement lasts at least min_time
+
+    Returns:
+        dict: best and median time of one call in seconds and count of calls per measurement
+    """
+    func()
+    timer = timeit.Timer(func)
+    number = 1
+    while timer.timeit(number) < min_time:
+        number *= 2
+    times = np.array(timer.repeat(repeat, number)) / number
+    return {'best': float(times.min()), 'median': float(np.median(times)), 'number': number}
+
+def thermal_model(n_parts, tmp_dir):
+    from ObjParser import ObjFileParser
+
+    path = os.path.join(tmp_dir, f'cylinders_{n_parts}.obj')
+    if not os.path.exists(path):
+        write_stacked_cylinders_obj(path, n_parts)
+    fe_model = ObjFileParser.parse_obj_to_finite_element_model(path)
+    fe_model.set_params(stacked_cylinders_params(n_parts))
+    return path, fe_model
+
+def bench_parse(sizes, tmp_dir, repeat):
+    from ObjParser import ObjFileParser
+
+    for n_parts in sizes:
+        path, _ = thermal_model(n_parts, tmp_dir)
+        yield f'parse[parts={n_parts}]', measure(lambda: ObjFileParser.parse_obj_to_finite_element_model(path), repeat)
+
+def bench_rhs(sizes, tmp_dir, repeat):
+    from HeatBalanceEquation import HeatBalanceEquation
+
+    for n_elem in sizes:
+        hbe = HeatBalanceEquation(thermal_model(n_elem, tmp_dir)[1])
+        y = hbe.fe_model.t0.astype(np.float64)
+        yield f'rhs[n_elem={n_elem}]', measure(lambda: hbe.equation(1.0, y, A), repeat)
+        yield f'jacobian[n_elem={n_elem}]', measure(lambda: hbe.jacobian(1.0, y, A), repeat)
+
+def bench_solve(sizes, tmp_dir, repeat):
+    from HeatBalanceEquation import HeatBalanceEquation
+
+    for n_elem in sizes:
+        fe_model = thermal_model(n_elem, tmp_dir)[1]
+        solve = lambda: HeatBalanceEquation(fe_model).solve(t_span=[0, 1000], y0=fe_model.t0, a=A)
+        yield f'solve[n_elem={n_elem}]', measure(solve, repeat, min_time=0)
+        yield f'steady[n_elem={n_elem}]', measure(lambda: HeatBalanceEquation(fe_model).steady_solution(A), repeat)
+
+def bench_nbody(sizes, tmp_dir, repeat):
+    from mp_solution import a_tiled, verlet_mp, NBodyEngine
+
+    for n_bodies in sizes:
+        y0, m = random_cluster(n_bodies)
+        t = np.linspace(0, 3 * 3600, 4)
+        positions = y0.reshape(-1, 4)[:, :2]
+        yield f'nbody_acceleration[n={n_bodies}]', measure(lambda: a_tiled(positions, m), repeat)
+        with NBodyEngine(m) as engine:
+            yield f'nbody_engine_acceleration[n={n_bodies}]', measure(lambda: engine.accelerations(positions), repeat)
+        yield f'nbody_steps[n={n_bodies},steps=3]', measure(lambda: verlet_mp(t, y0, m), repeat, min_time=0)
+
+def bench_kernel(sizes, tmp_dir, repeat):
+    from mp_solution import a_tiled, VerletIntegrator
+
+    for n_bodies in sizes:
+        y0, m = random_cluster(n_bodies)
+        positions = y0.reshape(-1, 4)[:, :2]
+        for dtype in (np.float64, np.float32):
+            yield f'nbody_tiled[n={n_bodies},{np.dtype(dtype).name}]', measure(lambda: a_tiled(positions, m, dtype=dtype), repeat)
+        integrator = VerletIntegrator(y0, m)
+        yield f'nbody_verlet_step[n={n_bodies}]', measure(lambda: integrator.step(60), repeat)
+
+def bench_barnes_hut(sizes, tmp_dir, repeat, theta=0.5):
+    from mp_solution import a_barnes_hut, barnes_hut_error
+
+    # accuracy against the direct sum is stored next to timings
+    systems = [('solar', solar_system())] + [(f'n={n_bodies}', random_cluster(n_bodies)) for n_bodies in sizes]
+    for name, (y0, m) in systems:
+        positions = y0.reshape(-1, 4)[:, :2]
+        result = measure(lambda: a_barnes_hut(positions, m, theta), repeat, min_time=0)
+        errors = barnes_hut_error(positions, m, theta, sample=200)
+        result.update({'median_error': float(np.median(errors)), 'max_error': float(errors.max())})
+        yield f'barnes_hut[{name},theta={theta}]', result
+
+BENCHMARKS = {'parse': bench_parse, 'rhs': bench_rhs, 'solve': bench_solve, 'nbody': bench_nbody, 'kernel': bench_kernel, 
+              'barnes_hut': bench_barnes_hut}
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, 
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(groups, size='full', repeat=5, label=None):
+    """
+    Run benchmark groups and return the history record
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for group in groups:
+            for name, result in BENCHMARKS[group](SIZES[size][group], tmp_dir, repeat):
+                results[name] = result
+                errors = ' '.join(f'{key} {value:.3g}' for key, value in result.items() if key.endswith('error'))
+                print(f"{name:40s} {result['best'] * 1e3:12.4f} ms {errors}", flush=True)
+    return {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'label': label,
+        'revision': git_revision(),
+        'size': size,
+        'machine': {'python': platform.python_version(), 'numpy': np.__version__, 
+                    'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'results': results
+    }
+
+def read_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def append_history(path, record):
+    with open(path, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+def find_record(history, label):
+    """
+    Find the last record with given label, or given index in the history if label is an integer
+    """
+    try:
+        return history[int(label)]
+    except (ValueError, IndexError):
+        pass
+    for record in reversed(history):
+        if record['label'] == label:
+            return record
+    raise KeyError(f'No benchmark record "{label}" in the history')
+
+def compare(baseline, current, threshold=1.25) -> list:
+    """
+    Compare best times of benchmarks present in both records and print the table
+
+    Returns:
+        list of strings: names of benchmarks slower than baseline by more than threshold times
+    """
+    regressions = []
+    for name, result in current['results'].items():
+        if name not in baseline['results']:
+            continue
+        ratio = result['best'] / baseline['results'][name]['best']
+        flag = ''
+        if ratio > threshold:
+            regressions.append(name)
+            flag = 'REGRESSION'
+        elif ratio < 1 / threshold:
+            flag = 'faster'
+        print(f"{name:40s} {baseline['results'][name]['best'] * 1e3:12.4f} ms {result['best'] * 1e3:12.4f} ms "
+              f"{ratio:8.2f}x {flag}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks of the thermal pipeline and the N-body solver')
+    parser.add_argument('--history', default=DEFAULT_HISTORY, help='json-lines file with benchmark history')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='run benchmarks and append results to the history')
+    run_parser.add_argument('groups', nargs='*', metavar='group', 
+                            help=f'benchmark groups of {", ".join(BENCHMARKS)}, all by default')
+    run_parser.add_argument('--quick', action='store_true', help='small workloads only')
+    run_parser.add_argument('--repeat', type=int, default=5, help='number of measurements of every benchmark')
+    run_parser.add_argument('--label', help='label of the record, e.g. "baseline"')
+    run_parser.add_argument('--compare', metavar='BASELINE', help='compare with record of given label or index')
+    run_parser.add_argument('--threshold', type=float, default=1.25, help='slowdown ratio treated as regression')
+
+    compare_parser = commands.add_parser('compare', help='compare two records of the history')
+    compare_parser.add_argument('baseline', help='label or index of the baseline record')
+    compare_parser.add_argument('current', nargs='?', default='-1', help='label or index of the compared record')
+    compare_parser.add_argument('--threshold', type=float, default=1.25, help='slowdown ratio treated as regression')
+
+    args = parser.parse_args(argv)
+    history = read_history(args.history)
+    if args.command == 'run':
+        unknown = set(args.groups) - set(BENCHMARKS)
+        if unknown:
+            parser.error(f'unknown benchmark groups: {", ".join(sorted(unknown))}')
+        # look up the baseline before running, so that a wrong label fails fast
+        baseline = find_record(history, args.compare) if args.compare is not None else None
+        record = run(args.groups or list(BENCHMARKS), 'quick' if args.quick else 'full', args.repeat, args.label)
+        append_history(args.history, record)
+        if baseline is None:
+            return 0
+        current = record
+    else:
+        baseline, current = find_record(history, args.baseline), find_record(history, args.current)
+    regressions = compare(baseline, current, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regressions against {baseline['label'] or baseline['time']}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+import numpy as np
+
+def write_stacked_cylinders_obj(path, n_parts, n_segments=32, radius=1.0, height=1.0) -> None:
+    """
+    Write .obj assembly of n_parts cylinders stacked along z, neighbour cylinders touch by their caps.
+    Every part has n_segments quads on the side and two n_segments-gons as caps.
+
+    Args:
+        path (string): path to .obj file
+        n_parts (int): count of parts
+        n_segments (int, optional): count of segments of the cylinder side. Defaults to 32.
+        radius (float, optional): radius of cylinders. Defaults to 1.
+        height (float, optional): height of every cylinder. Defaults to 1.
+    """
+    # shift of angles keeps side faces off axis-aligned planes
+    angles = 2 * np.pi * (np.arange(n_segments) + 0.123) / n_segments
+    ring = np.column_stack((radius * np.cos(angles), radius * np.sin(angles)))
+    lines = []
+    for part in range(n_parts):
+        for z in (part * height, (part + 1) * height):
+            lines += [f'v {x:.9f} {y:.9f} {z:.9f}' for x, y in ring]
+    for part in range(n_parts):
+        lines.append(f'g Cylinder.{part + 1}')
+        # 1-based indices of bottom and top rings
+        bottom = 2 * part * n_segments + 1 + np.arange(n_segments)
+        top = bottom + n_segments
+        following = np.roll(np.arange(n_segments), -1)
+        lines += [f'f {bottom[k]} {bottom[following[k]]} {top[following[k]]} {top[k]}' for k in range(n_segments)]
+        lines.append('f ' + ' '.join(map(str, bottom[::-1])))
+        lines.append('f ' + ' '.join(map(str, top)))
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+def stacked_cylinders_params(n_parts, seed=0) -> dict:
+    """
+    Parameters of the stacked cylinder assembly in the format of json parameter files:
+    conduction between neighbour cylinders and periodic heat flux into the first one
+    """
+    rng = np.random.default_rng(seed)
+    rows = np.arange(n_parts - 1)
+    values = rng.uniform(10, 30, n_parts - 1)
+    return {
+        "emissivity": rng.uniform(0.01, 0.1, n_parts).tolist(),
+        "coeffs": rng.uniform(500, 900, n_parts).tolist(),
+        "heat_fluxes": ["A * (20 + 3 * np.cos(t / 4))"] + [0] * (n_parts - 1),
+        "thermal_conductivity": {
+            "rows": np.concatenate((rows, rows + 1)).tolist(),
+            "cols": np.concatenate((rows + 1, rows)).tolist(),
+            "values": np.concatenate((values, values)).tolist()
+        },
+        "t0": rng.uniform(-30, 30, n_parts).tolist()
+    }
+
+def random_cluster(n_bodies, seed=0, size=1e11, mass=1e24):
+    """
+    Random cluster of bodies in the interleaved [x, y, vx, vy] layout of mp_solution
+
+    Returns:
+        np.array of shape (4 * n_bodies,): state vector
+        np.array of shape (n_bodies,): masses
+    """
+    rng = np.random.default_rng(seed)
+    y0 = np.zeros((n_bodies, 4))
+    y0[:, :2] = rng.uniform(-size, size, (n_bodies, 2))
+    y0[:, 2:] = rng.normal(0, 1e3, (n_bodies, 2))
+    m = rng.uniform(0.1, 1, n_bodies) * mass
+    return y0.ravel(), m
+
+def solar_system():
+    """
+    Sun and planets of the notebook in the interleaved [x, y, vx, vy] layout of mp_solution
+
+    Returns:
+        np.array of shape (36,): state vector
+        np.array of shape (9,): masses
+    """
+    m = np.array([1.989e+30, 0.330e+24, 4.87e+24, 5.97e+24, 0.642e+24, 1898e+24, 568e+24, 86.8e+24, 102e+24])
+    orbits = np.array([[0, 0], [57.9e+9, 48000], [108.2e+9, 35000], [149.6e+9, 29765], [228.0e+9, 24130], 
+                       [778.5e+9, 13070], [1432.0e+9, 9870], [2867.0e+9, 6810], [4515.0e+9, 5434]])
+    y0 = np.zeros((m.shape[0], 4))
+    y0[:, 0] = orbits[:, 0]
+    y0[:, 3] = orbits[:, 1]
+    return y0.ravel(), m
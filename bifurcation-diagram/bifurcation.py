@@ -0,0 +1,178 @@
+import functools
+import numpy as np
+import sympy as sp
+
+# Base set of parameters of the model, k_1 is the parameter of continuation
+BASE_PARAMS = {'k1m': 0.01, 'k3': 0.0032, 'k3m': 0.002, 'k2': 2.0}
+
+k1, k1m, k3, k2, x, y, z, k3m = sp.symbols('k_1 k_{-1} k_3 k_2 x y z k_{-3}')
+
+# Arguments of all compiled functions
+PARAMS = (k1m, k3, k3m, k2)
+
+@functools.lru_cache(maxsize=None)
+def symbolic_conditions() -> dict:
+    """
+    Derive the right hand side, Jacobian matrix A and conditions of bifurcations symbolically, 
+    the derivation runs once per process
+
+    Returns:
+        dict of sympy expressions:
+            'rhs', 'jacobian' - right hand side and Jacobian matrix of (x, y) as functions of x, y, k_1,
+            'rhs_k1' - derivative of the right hand side by k_1,
+            'y', 'k1' - equilibrium branch parametrized by x,
+            'det', 'trace' - det A and tr A on the branch,
+            'k1_saddle_node', 'k2_saddle_node' - line of multiplicity (det A = 0) on the plane (k_1, k_2),
+            'k1_hopf', 'k2_hopf', 'det_hopf' - line of neutrality (tr A = 0) and det A on it
+    """
+    z_xy = 1 - x - y
+    rhs = sp.Matrix([k1 * z_xy - k1m * x - k3 * x + k3m * y - k2 * z_xy**2 * x, 
+                     k3 * x - k3m * y])
+    jacobian = rhs.jacobian([x, y])
+
+    a11 = -k1 - k1m - k3 - k2 * z**2 + 2 * k2 * x * z
+    a12 = -k1 + k3m + 2 * k2 * z * x
+    a21 = k3
+    a22 = -k3m
+    dA = a11 * a22 - a12 * a21
+    SA = a11 + a22
+
+    # equilibrium: y from the second equation, k_1 from the first one
+    y_x = x * k3 / k3m
+    k1_x = (k1m * x + k2 * x * z**2) / z
+    on_branch = lambda expr: sp.simplify(expr.subs(z, 1 - x - y).subs(y, y_x))
+
+    k1_dA = sp.solve(dA, k1)[0]
+    k2_dA = sp.solve(k1_dA - k1_x, k2)[0]
+    k1_SA = sp.solve(SA, k1)[0]
+    k2_SA = sp.solve(k1_SA - k1_x, k2)[0]
+
+    k2_saddle_node = on_branch(k2_dA)
+    k2_hopf = on_branch(k2_SA)
+    return {
+        'rhs': rhs,
+        'jacobian': jacobian,
+        'rhs_k1': rhs.diff(k1),
+        'y': y_x,
+        'k1': on_branch(k1_x),
+        'det': on_branch(dA.subs(k1, k1_x)),
+        'trace': on_branch(SA.subs(k1, k1_x)),
+        'k1_saddle_node': on_branch(k1_dA).subs(k2, k2_saddle_node),
+        'k2_saddle_node': k2_saddle_node,
+        'k1_hopf': on_branch(k1_SA).subs(k2, k2_hopf),
+        'k2_hopf': k2_hopf,
+        'det_hopf': on_branch(dA.subs(k1, k1_SA)).subs(k2, k2_hopf)
+    }
+
+@functools.lru_cache(maxsize=None)
+def compiled_conditions() -> dict:
+    """
+    Symbolic conditions compiled by lambdify into NumPy functions. 
+    Functions of the branch take (x, k1m, k3, k3m, k2), right hand side and its derivatives take (x, y, k1, k1m, k3, k3m, k2), 
+    all arguments may be arrays broadcast against each other.
+    """
+    compiled = {}
+    for name, expr in symbolic_conditions().items():
+        if name in ('rhs', 'jacobian', 'rhs_k1'):
+            # matrices are compiled as flat lists of entries, so that entries may have different shapes
+            compiled[name] = sp.lambdify((x, y, k1) + PARAMS, list(expr), modules='numpy')
+        else:
+            compiled[name] = sp.lambdify((x,) + PARAMS, expr, modules='numpy')
+    return compiled
+
+def _evaluate(name, x_values, *args):
+    # constant expressions are broadcast to the shape of arguments
+    values = compiled_conditions()[name](x_values, *args)
+    return np.broadcast_to(values, np.broadcast(x_values, *args).shape).astype(np.float64)
+
+class BifurcationModel:
+    """
+    Model of the autocatalytic reaction on the catalyst surface with compiled bifurcation conditions
+    """
+
+    def __init__(self, k1m=BASE_PARAMS['k1m'], k3=BASE_PARAMS['k3'], k3m=BASE_PARAMS['k3m'], k2=BASE_PARAMS['k2']) -> None:
+        """
+        Args:
+            k1m (float or np.array, optional): value of k_{-1}. Defaults to BASE_PARAMS['k1m'].
+            k3 (float or np.array, optional): value of k_3. Defaults to BASE_PARAMS['k3'].
+            k3m (float or np.array, optional): value of k_{-3}. Defaults to BASE_PARAMS['k3m'].
+            k2 (float or np.array, optional): value of k_2. Defaults to BASE_PARAMS['k2'].
+        """
+        self.k1m = k1m
+        self.k3 = k3
+        self.k3m = k3m
+        self.k2 = k2
+
+    @property
+    def params(self):
+        return (self.k1m, self.k3, self.k3m, self.k2)
+
+    def rhs(self, x_values, y_values, k1_value):
+        """
+        Right hand side of the system
+
+        Returns:
+            np.array of shape (2, ...): dx/dt and dy/dt
+        """
+        shape = np.broadcast(x_values, y_values, k1_value, *self.params).shape
+        f = compiled_conditions()['rhs'](x_values, y_values, k1_value, *self.params)
+        return np.array([np.broadcast_to(value, shape) for value in f], dtype=np.float64)
+
+    def jacobian(self, x_values, y_values, k1_value):
+        """
+        Jacobian matrix of the system
+
+        Returns:
+            np.array of shape (2, 2, ...): matrix A
+        """
+        shape = np.broadcast(x_values, y_values, k1_value, *self.params).shape
+        A = compiled_conditions()['jacobian'](x_values, y_values, k1_value, *self.params)
+        return np.array([np.broadcast_to(value, shape) for value in A], dtype=np.float64).reshape((2, 2) + shape)
+
+    def rhs_k1(self, x_values, y_values, k1_value):
+        """
+        Derivative of the right hand side by k_1
+
+        Returns:
+            np.array of shape (2, ...): derivatives of dx/dt and dy/dt
+        """
+        shape = np.broadcast(x_values, y_values, k1_value, *self.params).shape
+        f = compiled_conditions()['rhs_k1'](x_values, y_values, k1_value, *self.params)
+        return np.array([np.broadcast_to(value, shape) for value in f], dtype=np.float64)
+
+    def branch(self, x_values) -> dict:
+        """
+        Equilibrium branch parametrized by x
+
+        Returns:
+            dict of np.arrays: 'k1', 'y', 'det' and 'trace' of A on the branch
+        """
+        return {name: _evaluate(name, x_values, *self.params) for name in ('k1', 'y', 'det', 'trace')}
+
+    def saddle_node_line(self, x_values):
+        """
+        Line of multiplicity det A = 0 on the plane (k_1, k_2), k_2 of the model is not used
+
+        Returns:
+            np.array: values of k_1
+            np.array: values of k_2
+        """
+        return (_evaluate('k1_saddle_node', x_values, *self.params), 
+                _evaluate('k2_saddle_node', x_values, *self.params))
+
+    def hopf_line(self, x_values):
+        """
+        Line of neutrality tr A = 0 on the plane (k_1, k_2), k_2 of the model is not used.
+        Points where det A <= 0 are not Hopf bifurcations and are set to NaN.
+
+        Returns:
+            np.array: values of k_1
+            np.array: values of k_2
+        """
+        k1_values = _evaluate('k1_hopf', x_values, *self.params)
+        k2_values = _evaluate('k2_hopf', x_values, *self.params)
+        with np.errstate(invalid='ignore'):
+            neutral = _evaluate('det_hopf', x_values, *self.params) <= 0
+        k1_values[neutral] = np.nan
+        k2_values[neutral] = np.nan
+        return k1_values, k2_values
@@ -0,0 +1,236 @@
+import numpy as np
+import multiprocessing as mp
+from scipy.optimize import brentq
+from bifurcation import *
+
+# Step control of the continuation: Newton iterations considered fast, growth and reduction of steps
+FAST_NEWTON_ITERATIONS = 3
+STEP_GROWTH = 1.5
+STEP_REDUCTION = 0.5
+
+# Default interval of k_1, the window of the parametric plot of the notebook
+K1_RANGE = (-1.0, 0.7)
+# The branch approaches x + y = 1 only as k_1 grows without bound, tracing stops this close to it
+Z_MIN = 1e-3
+
+class Branch:
+    """
+    Equilibrium branch traced by continuation in k_1 with its bifurcation points
+    """
+
+    def __init__(self, points, det, trace, bifurcations, n_evaluations) -> None:
+        """
+        Args:
+            points (np.array of shape (n, 3)): points (x, y, k_1) of the branch
+            det (np.array of shape (n,)): det A in points
+            trace (np.array of shape (n,)): tr A in points
+            bifurcations (list of dicts): bifurcation points with keys 'type', 'x', 'y' and 'k1'
+            n_evaluations (int): count of evaluations of the right hand side
+        """
+        self.x, self.y, self.k1 = points.T
+        self.det = det
+        self.trace = trace
+        self.stable = (det > 0) & (trace < 0)
+        self.bifurcations = bifurcations
+        self.n_evaluations = n_evaluations
+
+    def points_of(self, kind):
+        """
+        Bifurcation points of given type, 'saddle-node' or 'hopf'
+
+        Returns:
+            np.array of shape (n_points, 3): points (x, y, k_1)
+        """
+        return np.array([[point['x'], point['y'], point['k1']] for point in self.bifurcations 
+                         if point['type'] == kind]).reshape(-1, 3)
+
+class Continuation:
+    """
+    Pseudo-arclength continuation of equilibria of the model in k_1 with adaptive steps 
+    and refinement of bifurcation points by a bracketing root solver
+    """
+
+    def __init__(self, model: BifurcationModel, ds=1e-3, ds_min=1e-9, ds_max=0.05, tol=1e-12, max_iter=10) -> None:
+        """
+        Args:
+            model (BifurcationModel): model with fixed k_{-1}, k_3, k_{-3} and k_2
+            ds (float, optional): initial step along the branch. Defaults to 1e-3.
+            ds_min (float, optional): continuation stops if the step gets smaller. Defaults to 1e-9.
+            ds_max (float, optional): largest step. Defaults to 0.05.
+            tol (float, optional): tolerance of Newton corrections. Defaults to 1e-12.
+            max_iter (int, optional): largest count of Newton iterations. Defaults to 10.
+        """
+        self.model = model
+        self.ds = ds
+        self.ds_min = ds_min
+        self.ds_max = ds_max
+        self.tol = tol
+        self.max_iter = max_iter
+        self.n_evaluations = 0
+
+    def residual(self, w):
+        self.n_evaluations += 1
+        return self.model.rhs(*w)
+
+    def extended_jacobian(self, w):
+        # derivatives by (x, y, k_1)
+        return np.column_stack((self.model.jacobian(*w), self.model.rhs_k1(*w)))
+
+    def tangent(self, w, previous=None):
+        """
+        Unit tangent of the branch, oriented along the previous tangent
+        """
+        t = np.linalg.svd(self.extended_jacobian(w))[2][-1]
+        if previous is not None and t @ previous < 0:
+            t = -t
+        return t
+
+    def correct(self, w_pred, normal):
+        """
+        Newton corrections of the predicted point onto the branch in the hyperplane normal to the given vector
+
+        Returns:
+            np.array of shape (3,) or None: corrected point, None if Newton does not converge
+            int: count of iterations
+        """
+        w = w_pred.copy()
+        for iteration in range(1, self.max_iter + 1):
+            F = np.r_[self.residual(w), normal @ (w - w_pred)]
+            J = np.vstack((self.extended_jacobian(w), normal))
+            try:
+                dw = np.linalg.solve(J, -F)
+            except np.linalg.LinAlgError:
+                return None, iteration
+            w += dw
+            if np.linalg.norm(dw) <= self.tol * (1 + np.linalg.norm(w)):
+                return w, iteration
+        return None, self.max_iter
+
+    def test_functions(self, w):
+        A = self.model.jacobian(*w)
+        return np.linalg.det(A), np.trace(A)
+
+    def trace_branch(self, w0, direction=1.0, k1_range=K1_RANGE, max_steps=100000) -> Branch:
+        """
+        Trace the branch from the point w0 = (x, y, k_1) until it leaves k1_range or 
+        the physical domain x, y >= 0, x + y <= 1 - Z_MIN
+
+        Args:
+            w0 (array of shape (3,)): point on the branch
+            direction (float, optional): sign of dx/ds at the start. Defaults to 1.
+            k1_range (tuple of floats, optional): interval of k_1. Defaults to K1_RANGE.
+            max_steps (int, optional): largest count of steps. Defaults to 100000.
+
+        Returns:
+            Branch: points of the branch and refined bifurcation points
+        """
+        self.n_evaluations = 0
+        w, _ = self.correct(np.asarray(w0, dtype=np.float64), np.array([0.0, 0.0, 1.0]))
+        if w is None:
+            raise RuntimeError(f'No equilibrium near {w0}')
+        t = self.tangent(w)
+        t *= np.sign(t[0] * direction) or 1.0
+        points, tests, bifurcations = [w], [self.test_functions(w)], []
+        ds = self.ds
+        for _ in range(max_steps):
+            w_new, iterations = self.correct(w + ds * t, t)
+            if w_new is None:
+                ds *= STEP_REDUCTION
+                if ds < self.ds_min:
+                    break
+                continue
+            if not self._inside(w_new, k1_range):
+                break
+            test_new = self.test_functions(w_new)
+            bifurcations += self._refine(w, w_new, tests[-1], test_new)
+            t = self.tangent(w_new, t)
+            w = w_new
+            points.append(w)
+            tests.append(test_new)
+            if iterations <= FAST_NEWTON_ITERATIONS:
+                ds = min(ds * STEP_GROWTH, self.ds_max)
+        tests = np.array(tests)
+        return Branch(np.array(points), tests[:, 0], tests[:, 1], bifurcations, self.n_evaluations)
+
+    @staticmethod
+    def _inside(w, k1_range):
+        x_value, y_value, k1_value = w
+        return (k1_range[0] <= k1_value <= k1_range[1] and x_value >= 0 and y_value >= 0 
+                and x_value + y_value <= 1 - Z_MIN)
+
+    def _refine(self, w_a, w_b, test_a, test_b):
+        """
+        Find bifurcation points between two consecutive points of the branch. Points of the segment 
+        are corrected onto the branch, roots of test functions on it are found by brentq.
+        """
+        found = []
+        direction = w_b - w_a
+        normal = direction / np.linalg.norm(direction)
+
+        def on_branch(s):
+            w, _ = self.correct(w_a + s * direction, normal)
+            return w if w is not None else w_a + s * direction
+
+        for idx, kind in ((0, 'saddle-node'), (1, 'hopf')):
+            if test_a[idx] * test_b[idx] > 0 or test_a[idx] == test_b[idx]:
+                continue
+            s = brentq(lambda s: self.test_functions(on_branch(s))[idx], 0.0, 1.0, xtol=1e-15, rtol=4 * np.finfo(float).eps)
+            w = on_branch(s)
+            # tr A = 0 is a Hopf bifurcation only where det A > 0
+            if kind == 'hopf' and self.test_functions(w)[0] <= 0:
+                continue
+            found.append({'type': kind, 'x': w[0], 'y': w[1], 'k1': w[2]})
+        return found
+
+def branch_start(model, x0=1e-3):
+    """
+    Point (x, y, k_1) of the equilibrium branch at given x
+    """
+    values = model.branch(np.array([x0]))
+    return np.array([x0, values['y'][0], values['k1'][0]])
+
+def _sweep_case(params, k1_range, x0, options):
+    model = BifurcationModel(**params)
+    branch = Continuation(model, **options).trace_branch(branch_start(model, x0), k1_range=k1_range)
+    return [(point['type'], point['k1'], params['k2']) for point in branch.bifurcations], branch.n_evaluations
+
+def two_parameter_sweep(k2_values, k1_range=K1_RANGE, x0=1e-3, processes=None, params=None, **options):
+    """
+    Parametric portrait on the plane (k_1, k_2): the branch is traced in k_1 for every k_2 in parallel 
+    and its refined bifurcation points are collected
+
+    Args:
+        k2_values (array of floats): values of k_2
+        k1_range (tuple of floats, optional): interval of k_1. Defaults to K1_RANGE.
+        x0 (float, optional): x of the start of every branch. Defaults to 1e-3.
+        processes (int, optional): count of worker processes. Defaults to cpu count.
+        params (dict, optional): other parameters 'k1m', 'k3' and 'k3m'. Defaults to BASE_PARAMS.
+        options: options of Continuation
+
+    Returns:
+        dict: 'saddle-node' and 'hopf' arrays of shape (n_points, 2) of (k_1, k_2), 
+            'n_evaluations' count of evaluations of the right hand side
+    """
+    params = {**BASE_PARAMS, **(params or {})}
+    cases = [({**params, 'k2': float(k2_value)}, k1_range, x0, options) for k2_value in k2_values]
+    # derived once before workers are forked
+    compiled_conditions()
+    with mp.Pool(processes or mp.cpu_count()) as pool:
+        results = pool.starmap(_sweep_case, cases)
+    points = [point for case_points, _ in results for point in case_points]
+    portrait = {kind: np.array([[k1_value, k2_value] for point_kind, k1_value, k2_value in points 
+                                if point_kind == kind]).reshape(-1, 2) for kind in ('saddle-node', 'hopf')}
+    portrait['n_evaluations'] = sum(n_evaluations for _, n_evaluations in results)
+    return portrait
+
+def simulate(model, k1_value, u0, t_eval, method='LSODA'):
+    """
+    Solve the system for given k_1 passed explicitly instead of a global value
+
+    Returns:
+        scipy.integrate OdeResult: solution on t_eval
+    """
+    from scipy.integrate import solve_ivp
+
+    return solve_ivp(lambda t, u: model.rhs(u[0], u[1], k1_value), (t_eval[0], t_eval[-1]), u0, t_eval=t_eval, 
+                     method=method, jac=lambda t, u: model.jacobian(u[0], u[1], k1_value))
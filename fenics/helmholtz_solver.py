@@ -0,0 +1,239 @@
+import argparse
+import numpy as np
+import gmsh
+import ufl
+from mpi4py import MPI
+from petsc4py import PETSc
+from dolfinx import fem, io
+from dolfinx.fem.petsc import assemble_matrix, assemble_vector, apply_lifting, create_vector, set_bc
+
+# Global count of degrees of freedom from which CG with algebraic multigrid replaces the LU factorization
+AMG_MIN_DOFS = 200000
+# Relative tolerance of CG
+CG_RTOL = 1e-10
+
+def disk_mesh(R=1, size=0.05, comm=MPI.COMM_WORLD):
+    """
+    Triangulation of the disk of radius R centered in origin, generated by gmsh on rank 0
+    and distributed over comm
+
+    Args:
+        R (float): radius of the disk
+        size (float): characteristic length of cells
+        comm (MPI.Comm): communicator of the mesh
+
+    Returns:
+        dolfinx.mesh.Mesh: mesh of the disk
+    """
+    gdim = 2
+    gmsh.initialize()
+    gmsh.option.setNumber('General.Terminal', 0)
+    if comm.rank == 0:
+        circle = gmsh.model.occ.addDisk(0, 0, 0, R, R)
+        gmsh.model.occ.synchronize()
+        gmsh.model.addPhysicalGroup(gdim, [circle], 1)
+        gmsh.option.setNumber('Mesh.CharacteristicLengthMin', size)
+        gmsh.option.setNumber('Mesh.CharacteristicLengthMax', size)
+        gmsh.model.mesh.generate(gdim)
+    mesh, _, _ = io.gmshio.model_to_mesh(gmsh.model, comm, 0, gdim=gdim)
+    gmsh.finalize()
+    return mesh
+
+class HelmholtzSolver:
+    """
+    Solver of -Δu + αu = f in the disk with u = h on the left and du/dn = g on the right half of the boundary.
+    The matrix of a(u, v) with the Dirichlet rows is assembled and factorized (or preconditioned) once,
+    every problem after that assembles only its load vector
+    """
+
+    def __init__(self, mesh, R=1, alpha=100, degree=1, solver='auto') -> None:
+        """
+        Args:
+            mesh (dolfinx.mesh.Mesh): mesh of the disk
+            R (float): radius of the disk
+            alpha (float): coefficient α
+            degree (int): degree of Lagrange elements
+            solver (str): 'lu', 'amg' or 'auto' to choose AMG from AMG_MIN_DOFS degrees of freedom
+        """
+        self.mesh = mesh
+        self.comm = mesh.comm
+        self.V = fem.functionspace(mesh, ('Lagrange', degree))
+        self.left_boundary = fem.locate_dofs_geometrical(
+            self.V, lambda x: (x[0] < 0) & np.isclose(np.sqrt(x[0]**2 + x[1]**2), R))
+        self.n_dofs = self.V.dofmap.index_map.size_global * self.V.dofmap.index_map_bs
+
+        # Data of a problem are coefficients, so both forms are compiled once
+        self.f = fem.Function(self.V)
+        self.g = fem.Function(self.V)
+        self.u_lbc = fem.Function(self.V)
+        self.bcs = [fem.dirichletbc(self.u_lbc, self.left_boundary)]
+        u = ufl.TrialFunction(self.V)
+        v = ufl.TestFunction(self.V)
+        self.a = fem.form(ufl.dot(ufl.grad(u), ufl.grad(v)) * ufl.dx + alpha * ufl.dot(u, v) * ufl.dx)
+        self.L = fem.form(self.f * v * ufl.dx + self.g * v * ufl.ds)
+
+        # Rows of the Dirichlet dofs do not depend on h, only the lifting of the load vector does
+        self.A = assemble_matrix(self.a, bcs=self.bcs)
+        self.A.assemble()
+        self.b = create_vector(self.L)
+
+        if solver == 'auto':
+            solver = 'amg' if self.n_dofs >= AMG_MIN_DOFS else 'lu'
+        self.solver = solver
+        self.ksp = PETSc.KSP().create(self.comm)
+        self.ksp.setOperators(self.A)
+        pc = self.ksp.getPC()
+        if solver == 'lu':
+            self.ksp.setType(PETSc.KSP.Type.PREONLY)
+            pc.setType(PETSc.PC.Type.LU)
+            # MUMPS factorizes the distributed matrix when run under mpirun
+            pc.setFactorSolverType('mumps' if self.comm.size > 1 else 'petsc')
+        elif solver == 'amg':
+            # The matrix is symmetric positive definite, alpha > 0 keeps it so without the Dirichlet part too
+            self.ksp.setType(PETSc.KSP.Type.CG)
+            self.ksp.setTolerances(rtol=CG_RTOL)
+            # BoomerAMG when PETSc is built with hypre, the native smoothed aggregation otherwise
+            if PETSc.Sys.hasExternalPackage('hypre'):
+                pc.setType(PETSc.PC.Type.HYPRE)
+                pc.setHYPREType('boomeramg')
+            else:
+                pc.setType(PETSc.PC.Type.GAMG)
+        else:
+            raise ValueError(f'Unknown solver {solver}')
+        self.ksp.setFromOptions()
+        # Factorization or setup of the multigrid hierarchy happens here, once
+        self.ksp.setUp()
+        self.iterations = []
+
+    def interpolate(self, function, values):
+        """
+        Sets values of a coefficient
+
+        Args:
+            function (dolfinx.fem.Function): coefficient to set
+            values (callable or float): function of x, np.array of shape (3, n_points), or a constant
+        """
+        if callable(values):
+            function.interpolate(values)
+        else:
+            function.x.array[:] = values
+
+    def solve(self, f, g, h, uh=None):
+        """
+        Solves the problem with given data against the cached operator
+
+        Args:
+            f (callable or float): right hand side of the equation
+            g (callable or float): du/dn on the right half of the boundary
+            h (callable or float): u on the left half of the boundary
+            uh (dolfinx.fem.Function): function for the solution, new one by default
+
+        Returns:
+            dolfinx.fem.Function: numerical solution
+        """
+        self.interpolate(self.f, f)
+        self.interpolate(self.g, g)
+        self.interpolate(self.u_lbc, h)
+        if uh is None:
+            uh = fem.Function(self.V)
+
+        with self.b.localForm() as b_local:
+            b_local.set(0)
+        assemble_vector(self.b, self.L)
+        apply_lifting(self.b, [self.a], bcs=[self.bcs])
+        self.b.ghostUpdate(addv=PETSc.InsertMode.ADD, mode=PETSc.ScatterMode.REVERSE)
+        set_bc(self.b, self.bcs)
+
+        self.ksp.solve(self.b, uh.x.petsc_vec)
+        uh.x.scatter_forward()
+        self.iterations.append(self.ksp.getIterationNumber())
+        return uh
+
+    def solve_batch(self, cases):
+        """
+        Solves problems one after another with the same factorization
+
+        Args:
+            cases (iterable of tuples): data (f, g, h) of problems
+
+        Returns:
+            list of dolfinx.fem.Function: numerical solutions
+        """
+        return [self.solve(f, g, h) for f, g, h in cases]
+
+    def errors(self, uh, exact):
+        """
+        Deviation of numerical solution from the exact one interpolated on the mesh
+
+        Args:
+            uh (dolfinx.fem.Function): numerical solution
+            exact (callable): exact solution, function of x
+
+        Returns:
+            tuple of floats: errors in max-norm and L2-norm
+        """
+        u_sol = fem.Function(self.V)
+        u_sol.interpolate(exact)
+        error_L2 = fem.assemble_scalar(fem.form((uh - u_sol)**2 * ufl.dx))
+        error_L2 = np.sqrt(self.comm.allreduce(error_L2, op=MPI.SUM))
+        error_max = np.max(np.abs(uh.x.array - u_sol.x.array), initial=0)
+        error_max = self.comm.allreduce(error_max, op=MPI.MAX)
+        return error_max, error_L2
+
+def manufactured_cases(alpha=100, R=1):
+    """
+    Manufactured solutions of the notebook, h is the exact solution, 
+    f = -Δh + αh and g = n·∇h with the outer normal n = (x, y) / R of the circle
+
+    Returns:
+        list of tuples: (name, f, g, h), functions of x
+    """
+    def exp_r2(x):
+        return np.exp(x[0]**2 + x[1]**2)
+
+    return [
+        ('sin(x) cos(y)',
+         lambda x: (2 + alpha) * np.sin(x[0]) * np.cos(x[1]),
+         lambda x: (x[0] * np.cos(x[0]) * np.cos(x[1]) - x[1] * np.sin(x[0]) * np.sin(x[1])) / R,
+         lambda x: np.sin(x[0]) * np.cos(x[1])),
+        ('exp(x^2 + y^2)',
+         lambda x: -4 * exp_r2(x) * (1 + x[0]**2 + x[1]**2) + alpha * exp_r2(x),
+         lambda x: 2 * (x[0]**2 + x[1]**2) * exp_r2(x) / R,
+         exp_r2),
+        ('x^2 + y',
+         lambda x: -2 + alpha * (x[0]**2 + x[1]),
+         lambda x: (2 * x[0]**2 + x[1]) / R,
+         lambda x: x[0]**2 + x[1]),
+        ('x',
+         lambda x: alpha * x[0],
+         lambda x: x[0] / R,
+         lambda x: x[0]),
+    ]
+
+if __name__ == '__main__':
+    # mpirun -n 4 python helmholtz_solver.py --size 0.005 --solver amg
+    parser = argparse.ArgumentParser(description='Solves the boundary problems of the notebook with one operator')
+    parser.add_argument('--size', type=float, default=0.05, help='characteristic length of cells')
+    parser.add_argument('--solver', choices=('auto', 'lu', 'amg'), default='auto')
+    parser.add_argument('--alpha', type=float, default=100)
+    parser.add_argument('-R', type=float, default=1)
+    args = parser.parse_args()
+
+    comm = MPI.COMM_WORLD
+    mesh = disk_mesh(args.R, args.size, comm)
+    start = MPI.Wtime()
+    solver = HelmholtzSolver(mesh, args.R, args.alpha, solver=args.solver)
+    setup_time = MPI.Wtime() - start
+
+    cases = manufactured_cases(args.alpha, args.R)
+    start = MPI.Wtime()
+    solutions = solver.solve_batch((f, g, h) for _, f, g, h in cases)
+    solve_time = MPI.Wtime() - start
+
+    for (name, _, _, h), uh, iterations in zip(cases, solutions, solver.iterations):
+        error_max, error_L2 = solver.errors(uh, h)
+        if comm.rank == 0:
+            print(f'h = {name}: max-norm {error_max:.3e}, L2-norm {error_L2:.3e}, iterations {iterations}')
+    if comm.rank == 0:
+        print(f'{solver.n_dofs} dofs on {comm.size} processes, {solver.solver}: '
+              f'setup {setup_time:.3f} s, {len(cases)} solves {solve_time:.3f} s')
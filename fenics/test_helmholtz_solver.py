@@ -0,0 +1,31 @@
+import pytest
+
+pytest.importorskip('dolfinx')
+pytest.importorskip('petsc4py')
+pytest.importorskip('gmsh')
+
+from mpi4py import MPI
+from helmholtz_solver import *
+
+# Characteristic lengths of cells of the coarse and the refined mesh
+MESH_SIZES = (0.1, 0.05)
+
+@pytest.mark.parametrize('solver_type', ['lu', 'amg'])
+def test_manufactured_cases_converge_with_one_operator(solver_type):
+    # the polynomial cases are resolved almost exactly by linear elements, so they do not show convergence
+    cases = manufactured_cases()[:2]
+    errors = []
+    for size in MESH_SIZES:
+        solver = HelmholtzSolver(disk_mesh(size=size, comm=MPI.COMM_WORLD), solver=solver_type)
+        A, ksp = solver.A, solver.ksp
+        solutions = solver.solve_batch((f, g, h) for _, f, g, h in cases)
+        # every case is solved against the operator assembled and set up in the constructor
+        assert solver.A is A and solver.ksp is ksp
+        assert solver.ksp.getOperators()[0].handle == A.handle
+        assert len(solver.iterations) == len(cases)
+        errors.append([solver.errors(uh, h) for (_, _, _, h), uh in zip(cases, solutions)])
+
+    for (name, *_), coarse, fine in zip(cases, *errors):
+        # linear elements converge as h^2 in L2-norm, halving the cells has to at least halve the errors
+        assert fine[0] < 0.5 * coarse[0], name
+        assert fine[1] < 0.5 * coarse[1], name
@@ -0,0 +1,176 @@
+import os
+import mmap
+import shutil
+import tempfile
+import subprocess
+import numpy as np
+import multiprocessing as mp
+
+# Count of frames read at once when limits of the plot are searched for
+LIMITS_BLOCK_SIZE = 1024
+
+def _frames_source(frames):
+    # memory-mapped frames, whole or any view of them, are passed to workers as the file, 
+    # the byte offset of the first element, shape, strides and dtype, other arrays are pickled
+    root = frames
+    while isinstance(root, np.ndarray) and not isinstance(root.base, mmap.mmap):
+        root = root.base
+    if not isinstance(root, np.memmap) or not root.filename:
+        return frames
+    offset = root.offset + frames.__array_interface__['data'][0] - root.__array_interface__['data'][0]
+    return root.filename, offset, frames.shape, frames.strides, frames.dtype.str
+
+def _open_frames(source):
+    # memory-mapped trajectories are reopened by workers instead of being pickled
+    if isinstance(source, tuple):
+        filename, offset, shape, strides, dtype = source
+        buffer = np.memmap(filename, dtype=np.uint8, mode='r')
+        return np.ndarray(shape, dtype, buffer=buffer, offset=offset, strides=strides)
+    return source
+
+def _positions(frames):
+    # (n_frames, 4 * n) interleaved states -> (n_frames, n, 2) positions
+    return frames.reshape(frames.shape[0], -1, 4)[:, :, :2]
+
+def orbit_limits(frames, margin=0.05):
+    """
+    Square limits of the plot containing all bodies in all frames, frames are read by blocks
+
+    Returns:
+        tuple of floats: lower and upper limit of both axes
+    """
+    lower, upper = np.inf, -np.inf
+    for start in range(0, frames.shape[0], LIMITS_BLOCK_SIZE):
+        positions = _positions(np.asarray(frames[start:start + LIMITS_BLOCK_SIZE]))
+        lower, upper = min(lower, positions.min()), max(upper, positions.max())
+    pad = margin * (upper - lower) or 1.0
+    return lower - pad, upper + pad
+
+def _render_frames(source, frame_ids, out_dir, stride, trail, style):
+    from PIL import Image
+    from matplotlib.figure import Figure
+    from matplotlib.collections import LineCollection
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    frames = _open_frames(source)
+    fig = Figure(figsize=style['figsize'], dpi=style['dpi'])
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.set_xlim(style['limits'])
+    ax.set_ylim(style['limits'])
+    ax.set_aspect('equal')
+    colors = style['colors']
+    # artists are created once and only updated in every frame
+    trails = LineCollection([], colors=colors, linewidths=0.8, alpha=0.5, animated=True)
+    ax.add_collection(trails)
+    scatter = ax.scatter(*_positions(np.asarray(frames[:1]))[0].T, c=colors, s=style['size'], zorder=3, animated=True)
+    if style['names'] is not None:
+        handles = [ax.scatter([], [], color=color, s=style['size']) for color in colors]
+        ax.legend(handles, style['names'], loc='upper right', fontsize='small')
+    title = ax.text(0.5, 1.01, '', transform=ax.transAxes, ha='center', va='bottom', animated=True)
+    # axes, ticks and legend are drawn once, frames only blit animated artists over them
+    canvas.draw()
+    background = canvas.copy_from_bbox(fig.bbox)
+
+    for frame_id in frame_ids:
+        scatter.set_offsets(_positions(np.asarray(frames[frame_id:frame_id + 1]))[0])
+        if trail:
+            history = np.asarray(frames[max(frame_id - trail * stride, 0):frame_id + 1:stride])
+            trails.set_segments(_positions(history).transpose(1, 0, 2))
+        title.set_text(style['titles'][frame_id // stride] if style['titles'] is not None else '')
+        canvas.restore_region(background)
+        for artist in (trails, scatter, title):
+            fig.draw_artist(artist)
+        image = Image.frombuffer('RGBA', canvas.get_width_height(), canvas.buffer_rgba(), 'raw', 'RGBA', 0, 1)
+        image.convert('RGB').save(os.path.join(out_dir, f'frame_{frame_id // stride:07d}.png'))
+
+def _write_gif(frame_paths, path, fps):
+    # Pillow keeps all frames of save_all in memory, so frames are written one by one 
+    # with one global palette taken from the first and the last frames
+    from PIL import Image, GifImagePlugin
+
+    with Image.open(frame_paths[0]) as first, Image.open(frame_paths[-1]) as last:
+        sample = Image.new('RGB', (first.width, 2 * first.height))
+        sample.paste(first.convert('RGB'), (0, 0))
+        sample.paste(last.convert('RGB'), (0, first.height))
+    palette = sample.quantize(colors=256, dither=Image.Dither.NONE)
+
+    def quantized(frame_path):
+        with Image.open(frame_path) as frame:
+            return frame.convert('RGB').quantize(palette=palette, dither=Image.Dither.NONE)
+
+    with open(path, 'wb') as f:
+        frame = quantized(frame_paths[0])
+        header, _ = GifImagePlugin.getheader(frame, info={'loop': 0})
+        f.writelines(header)
+        previous = None
+        for idx, frame_path in enumerate(frame_paths):
+            frame = quantized(frame_path) if idx > 0 else frame
+            pixels = np.asarray(frame)
+            box = (0, 0) + frame.size
+            if previous is not None:
+                # only the region changed since the previous frame is written
+                rows, cols = np.nonzero(pixels != previous)
+                box = (cols.min(), rows.min(), cols.max() + 1, rows.max() + 1) if rows.shape[0] > 0 else (0, 0, 1, 1)
+            previous = pixels
+            f.writelines(GifImagePlugin.getdata(frame.crop(box), offset=box[:2], duration=1000 / fps))
+        f.write(b';')
+
+def _encode(frame_paths, path, fps):
+    if path.endswith('.gif'):
+        _write_gif(frame_paths, path, fps)
+        return
+    if shutil.which('ffmpeg') is None:
+        raise RuntimeError(f'ffmpeg is needed to encode {path}, only .gif is encoded without it')
+    pattern = os.path.join(os.path.dirname(frame_paths[0]), 'frame_%07d.png')
+    subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', '-framerate', str(fps), '-i', pattern, 
+                    '-pix_fmt', 'yuv420p', path], check=True)
+
+def render_orbits(frames, path, stride=1, trail=0, names=None, colors=None, limits=None, titles=None, 
+                  fps=30, size=20, figsize=(6, 6), dpi=100, processes=None) -> int:
+    """
+    Render trajectory into an animation. Frames are drawn by worker processes, every worker keeps 
+    one figure and updates positions of one scatter collection and trails in it, 
+    then frames are encoded in order, .gif frames are streamed to the file one by one with one palette. 
+    Memory use depends neither on the count of frames nor on the run length.
+
+    Args:
+        frames (np.array or np.memmap of shape (n_frames, 4 * n)): states in the interleaved [x, y, vx, vy] layout
+        path (string): .gif file, other formats are encoded by ffmpeg
+        stride (int, optional): every stride-th frame is rendered. Defaults to 1.
+        trail (int, optional): length of trails in rendered frames, 0 for no trails. Defaults to 0.
+        names (list of strings, optional): names of bodies shown in the legend. Defaults to None.
+        colors (list of colors, optional): colors of bodies. Defaults to 'tab10' colormap.
+        limits (tuple of floats, optional): limits of both axes. Defaults to limits of all bodies.
+        titles (list of strings, optional): titles of rendered frames. Defaults to None.
+        fps (int, optional): frames per second. Defaults to 30.
+        size (float, optional): size of markers. Defaults to 20.
+        figsize (tuple, optional): size of the figure in inches. Defaults to (6, 6).
+        dpi (int, optional): resolution of the figure. Defaults to 100.
+        processes (int, optional): count of worker processes. Defaults to cpu count.
+
+    Returns:
+        int: count of rendered frames
+    """
+    from matplotlib import colormaps
+
+    source = _frames_source(frames)
+    n_bodies = frames.shape[1] // 4
+    if colors is None:
+        colors = colormaps['tab10'](np.arange(n_bodies) % 10)
+    style = {'limits': limits if limits is not None else orbit_limits(frames), 'colors': colors, 'names': names, 
+             'titles': titles, 'size': size, 'figsize': figsize, 'dpi': dpi}
+
+    frame_ids = np.arange(0, frames.shape[0], stride)
+    processes = min(processes or mp.cpu_count(), frame_ids.shape[0])
+    with tempfile.TemporaryDirectory() as out_dir:
+        # every worker renders a contiguous part of frames
+        parts = [(source, part, out_dir, stride, trail, style) for part in np.array_split(frame_ids, processes)]
+        if processes == 1:
+            _render_frames(*parts[0])
+        else:
+            with mp.Pool(processes) as pool:
+                pool.starmap(_render_frames, parts)
+        frame_paths = [os.path.join(out_dir, f'frame_{idx:07d}.png') for idx in range(frame_ids.shape[0])]
+        _encode(frame_paths, path, fps)
+    return frame_ids.shape[0]
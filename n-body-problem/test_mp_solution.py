@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+from mp_solution import *
+
+# Documented accuracy of Barnes-Hut on a uniform random cluster: 
+# theta -> (median relative error, largest error relative to the RMS acceleration)
+BH_ERROR_BOUNDS = {0.3: (0.005, 0.005), 0.5: (0.015, 0.02), 0.8: (0.05, 0.1)}
+
+# Documented accuracy of Barnes-Hut on the Sun and planets: 
+# theta -> largest relative error of a single body
+BH_SOLAR_BOUNDS = {0.3: 1e-3, 0.5: 5e-3, 0.8: 5e-2}
+
+def random_cluster(n_bodies, seed=0, size=1e11, mass=1e24):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(-size, size, (n_bodies, 2)), rng.uniform(0.1, 1, n_bodies) * mass
+
+def test_tiled_matches_loop():
+    positions, m = random_cluster(300)
+    direct = a_loop(positions, m)
+    np.testing.assert_allclose(a_tiled(positions, m, tile=64), direct, rtol=1e-10, atol=0)
+    np.testing.assert_allclose(a_tiled(positions, m, dtype=np.float32), direct, rtol=1e-3, 
+                               atol=1e-4 * np.abs(direct).max())
+
+def test_rows_match_tiled():
+    positions, m = random_cluster(700, seed=1)
+    rows = np.array([0, 5, 256, 257, 699])
+    np.testing.assert_allclose(a_rows(positions, m, rows, softening=1e8), 
+                               a_tiled(positions, m, softening=1e8)[rows], rtol=1e-10)
+
+def test_barnes_hut_zero_theta_is_direct_sum():
+    positions, m = random_cluster(500, seed=2)
+    direct = a_tiled(positions, m)
+    np.testing.assert_allclose(a_barnes_hut(positions, m, theta=0.0), direct, rtol=1e-9, 
+                               atol=1e-12 * np.abs(direct).max())
+
+@pytest.mark.parametrize('theta', sorted(BH_ERROR_BOUNDS))
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_barnes_hut_error_bound(theta, seed):
+    positions, m = random_cluster(2000, seed=seed)
+    direct = a_tiled(positions, m)
+    error = np.linalg.norm(a_barnes_hut(positions, m, theta) - direct, axis=1)
+    norm = np.linalg.norm(direct, axis=1)
+    median_bound, max_bound = BH_ERROR_BOUNDS[theta]
+    assert np.median(error / norm) < median_bound
+    assert error.max() < max_bound * np.sqrt(np.mean(norm**2))
+
+def solar_system(angles=None):
+    # Sun and planets of the notebook, lined up on the x axis or turned by the given angles
+    m = np.array([1.989e+30, 0.330e+24, 4.87e+24, 5.97e+24, 0.642e+24, 1898e+24, 568e+24, 86.8e+24, 102e+24])
+    r = np.array([0, 57.9e+9, 108.2e+9, 149.6e+9, 228.0e+9, 778.5e+9, 1432.0e+9, 2867.0e+9, 4515.0e+9])
+    angles = np.zeros_like(r) if angles is None else angles
+    return r[:, None] * np.column_stack([np.cos(angles), np.sin(angles)]), m
+
+@pytest.mark.parametrize('theta', sorted(BH_SOLAR_BOUNDS))
+@pytest.mark.parametrize('seed', [None, 0, 1, 2, 3])
+def test_barnes_hut_solar_system_bound(theta, seed):
+    angles = None if seed is None else np.random.default_rng(seed).uniform(0, 2 * np.pi, 9)
+    positions, m = solar_system(angles)
+    direct = a_tiled(positions, m)
+    error = np.linalg.norm(a_barnes_hut(positions, m, theta) - direct, axis=1)
+    # the Sun outweighs the planets by three orders, so every body is bounded, not only the bulk
+    assert np.all(error < BH_SOLAR_BOUNDS[theta] * np.linalg.norm(direct, axis=1))
+
+@pytest.mark.parametrize('theta', [None, 0.5])
+def test_engine_matches_serial(theta):
+    positions, m = random_cluster(600, seed=3)
+    expected = a_tiled(positions, m) if theta is None else a_barnes_hut(positions, m, theta)
+    with NBodyEngine(m, processes=2, theta=theta) as engine:
+        for _ in range(2):
+            np.testing.assert_allclose(engine.accelerations(positions), expected, rtol=1e-9, 
+                                       atol=1e-12 * np.abs(expected).max())
+
+def test_engine_reports_failed_worker():
+    positions, m = random_cluster(100, seed=4)
+    with pytest.raises(RuntimeError, match='Engine worker'):
+        with NBodyEngine(m, processes=2, dtype=np.int64) as engine:
+            engine.accelerations(positions)
+
+@pytest.mark.parametrize('theta', [None, 0.5])
+def test_engine_computes_requested_rows(theta):
+    positions, m = random_cluster(600, seed=5)
+    rows = np.array([3, 10, 11, 400, 599])
+    expected = a_rows(positions, m, rows) if theta is None else a_barnes_hut(positions, m, theta)[rows]
+    out = np.full((600, 2), 7.0)
+    with NBodyEngine(m, processes=2, theta=theta) as engine:
+        engine.accelerations(positions, out=out, rows=rows)
+    np.testing.assert_allclose(out[rows], expected, rtol=1e-9)
+    assert np.all(np.delete(out, rows, axis=0) == 7.0)
+
+def test_block_steps_with_engine_match_serial():
+    positions, m = random_cluster(50, seed=6)
+    y0 = np.column_stack((positions, np.random.default_rng(6).normal(0, 1e3, (50, 2)))).ravel()
+    serial = VerletIntegrator(y0, m)
+    with NBodyEngine(m, processes=2) as engine:
+        parallel = VerletIntegrator(y0, m, engine.accelerations)
+        for _ in range(3):
+            serial.block_step(1e4)
+            parallel.block_step(1e4)
+    np.testing.assert_allclose(parallel.state(), serial.state(), rtol=1e-9)
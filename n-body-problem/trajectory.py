@@ -0,0 +1,81 @@
+import os
+import numpy as np
+
+class TrajectorySink:
+    """
+    Storage of N-body trajectory frames. Every stride-th state is written to a memory-mapped .npy file 
+    as the integration goes, so that RAM use does not depend on the length of the run. 
+    Checkpoints next to the file allow to resume interrupted runs from the last saved state.
+    Without path frames are kept in memory and checkpoints are not written.
+    """
+
+    def __init__(self, path=None, stride=1, checkpoint_interval=100) -> None:
+        """
+        Args:
+            path (string, optional): path to .npy file of frames. Defaults to None.
+            stride (int, optional): every stride-th step is saved. Defaults to 1.
+            checkpoint_interval (int, optional): steps between checkpoints, 0 to turn them off. Defaults to 100.
+        """
+        self.path = path
+        self.stride = stride
+        self.checkpoint_interval = checkpoint_interval if path is not None else 0
+        self.checkpoint_path = f'{path}.checkpoint.npz' if path is not None else None
+        self.frames = None
+
+    def open(self, t, y0, resume=False):
+        """
+        Allocate frames for the time grid and write the initial state, 
+        or reopen frames and load the last checkpoint if the run is resumed
+
+        Args:
+            t (np.array of shape (n_t,)): time grid of the run
+            y0 (np.array of shape (n_state,)): initial state
+            resume (bool, optional): continue from the checkpoint if it exists. Defaults to False.
+
+        Returns:
+            int: step to continue from
+            np.array of shape (n_state,): state at this step
+        """
+        shape = ((t.shape[0] - 1) // self.stride + 1, y0.shape[0])
+        if resume and self.checkpoint_path is not None and os.path.exists(self.checkpoint_path):
+            with np.load(self.checkpoint_path) as checkpoint:
+                if tuple(checkpoint['shape']) != shape or int(checkpoint['stride']) != self.stride:
+                    raise ValueError(f'Checkpoint {self.checkpoint_path} belongs to another run')
+                step, state = int(checkpoint['step']), checkpoint['state'].copy()
+            self.frames = np.lib.format.open_memmap(self.path, mode='r+')
+            return step, state
+
+        if self.path is None:
+            self.frames = np.empty(shape, dtype=np.float64)
+        else:
+            self.frames = np.lib.format.open_memmap(self.path, mode='w+', dtype=np.float64, shape=shape)
+        self.frames[0] = y0
+        return 0, np.asarray(y0, dtype=np.float64)
+
+    def frame(self, step):
+        """
+        Row of frames to store the state of given step in, None if the step is not saved
+        """
+        if step % self.stride != 0:
+            return None
+        return self.frames[step // self.stride]
+
+    def checkpoint_due(self, step, last_step) -> bool:
+        """
+        Checkpoints are saved every checkpoint_interval steps and at the last step
+        """
+        return bool(self.checkpoint_interval) and (step % self.checkpoint_interval == 0 or step == last_step)
+
+    def checkpoint(self, step, state) -> None:
+        """
+        Flush frames and save the state of given step
+        """
+        self.frames.flush()
+        # written to the temporary file first, so that an interrupted write keeps the previous checkpoint
+        tmp_path = f'{self.checkpoint_path}.tmp.npz'
+        np.savez(tmp_path, step=step, state=state, shape=np.array(self.frames.shape), stride=self.stride)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def close(self) -> None:
+        if isinstance(self.frames, np.memmap):
+            self.frames.flush()
@@ -0,0 +1,165 @@
+import os
+import csv
+import copy
+import json
+import time
+import argparse
+import itertools
+import multiprocessing as mp
+import numpy as np
+from ObjParser import *
+from HeatBalanceEquation import *
+from ResultsWriter import *
+from EnsembleHeatBalanceEquation import *
+
+# Value of A in heat flux expressions used by the GUI
+DEFAULT_A = 50
+
+# Model shared by all cases, set once in every worker process
+_base_model = None
+
+def _init_worker(fe_model):
+    global _base_model
+    _base_model = fe_model
+
+def read_sweep(path):
+    """
+    Read sweep specification from json-file and expand it into the list of cases.
+    The file contains either a list of parameter overrides, or a dict with 
+    "cases" (list of overrides) and/or "grid" (dict of parameter -> list of values),
+    in the latter case every case is combined with every point of the grid.
+    Overrides use keys of parameter files and "A" for the heat flux amplitude.
+
+    Returns:
+        list of dicts: parameter overrides of every case
+    """
+    with open(path) as f:
+        spec = json.load(f)
+    if isinstance(spec, list):
+        return spec
+    cases = spec.get("cases", [{}])
+    grid = spec.get("grid", {})
+    names = list(grid)
+    points = [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+    return [{**case, **point} for case in cases for point in points]
+
+def run_case(case_idx, overrides, t_max, n_points, out_dir, file_format):
+    """
+    Solve the heat balance equation for the shared model with given parameter overrides 
+    and write results of the case into its own file
+
+    Returns:
+        dict: summary of the case
+    """
+    start = time.perf_counter()
+    fe_model = copy.copy(_base_model)
+    fe_model.set_params(overrides)
+    a = overrides.get("A", DEFAULT_A)
+    summary = {"case": case_idx, "params": json.dumps(overrides)}
+
+    try:
+        hbe = HeatBalanceEquation(fe_model)
+        sol = hbe.solve(t_span=[0, t_max], y0=fe_model.t0, a=a, dense_output=True)
+        if not sol.success:
+            raise RuntimeError(sol.message)
+        t = np.linspace(0, t_max, n_points)
+        y = sol.sol(t).T
+        path = os.path.join(out_dir, f'case_{case_idx:04d}.{file_format}')
+        with ResultsWriter(path, fe_model.n_elem, file_format) as writer:
+            writer.write(t, y)
+        summary.update({"status": "ok", "file": os.path.basename(path), "nfev": sol.nfev})
+        summary.update({f"T{idx + 1}": value for idx, value in enumerate(y[-1])})
+    except Exception as e:
+        summary.update({"status": f"failed: {e}"})
+
+    summary["time"] = time.perf_counter() - start
+    return summary
+
+def run_ensemble(case_indices, cases, t_max, n_points, out_dir, file_format):
+    """
+    Solve cases of the block as one ensemble and write results of every case into its own file
+
+    Returns:
+        list of dicts: summaries of cases
+    """
+    start = time.perf_counter()
+    summaries = [{"case": idx, "params": json.dumps(case)} for idx, case in zip(case_indices, cases)]
+    try:
+        ensemble = EnsembleHeatBalanceEquation(_base_model, cases, a=DEFAULT_A)
+        t, y = ensemble.solve(t_span=[0, t_max], t_eval=np.linspace(0, t_max, n_points))
+        for summary, y_case in zip(summaries, y):
+            path = os.path.join(out_dir, f'case_{summary["case"]:04d}.{file_format}')
+            with ResultsWriter(path, _base_model.n_elem, file_format) as writer:
+                writer.write(t, y_case)
+            summary.update({"status": "ok", "file": os.path.basename(path)})
+            summary.update({f"T{idx + 1}": value for idx, value in enumerate(y_case[-1])})
+    except Exception as e:
+        for summary in summaries:
+            summary.update({"status": f"failed: {e}"})
+
+    # time of the block is shared equally by its cases
+    for summary in summaries:
+        summary["time"] = (time.perf_counter() - start) / len(summaries)
+    return summaries
+
+def run_batch(fe_model, cases, t_max, out_dir, n_points=100, file_format='csv', processes=None, ensemble=False):
+    """
+    Run all cases over the pool of processes, the model is sent to every process only once
+
+    Args:
+        fe_model (FiniteElementModel): parsed model with base parameters
+        cases (list of dicts): parameter overrides of every case
+        t_max (float): calculation time
+        out_dir (string): directory for results of cases and the summary
+        n_points (int, optional): number of points in results of every case. Defaults to 100.
+        file_format (string, optional): 'csv' or 'npy'. Defaults to 'csv'.
+        processes (int, optional): number of worker processes. Defaults to the number of CPUs.
+        ensemble (bool, optional): solve cases of every process as one ensemble. Defaults to False.
+
+    Returns:
+        list of dicts: summaries of cases
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    processes = processes or mp.cpu_count()
+    with mp.Pool(processes=processes, initializer=_init_worker, initargs=(fe_model,)) as pool:
+        if ensemble:
+            blocks = [block for block in np.array_split(np.arange(len(cases)), processes) if block.shape[0] > 0]
+            tasks = [(block.tolist(), [cases[idx] for idx in block], t_max, n_points, out_dir, file_format) 
+                     for block in blocks]
+            summaries = [summary for block in pool.starmap(run_ensemble, tasks) for summary in block]
+        else:
+            tasks = [(idx, case, t_max, n_points, out_dir, file_format) for idx, case in enumerate(cases)]
+            summaries = pool.starmap(run_case, tasks, chunksize=max(1, len(tasks) // (4 * processes)))
+
+    columns = ["case", "status", "time", "nfev", "file"] + [f"T{idx + 1}" for idx in range(fe_model.n_elem)] + ["params"]
+    with open(os.path.join(out_dir, 'summary.csv'), 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns, restval='')
+        writer.writeheader()
+        writer.writerows(summaries)
+    return summaries
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run heat balance calculations for a sweep of parameters')
+    parser.add_argument('model', help='path to .obj model file')
+    parser.add_argument('params', help='path to json-file with base parameters')
+    parser.add_argument('sweep', help='path to json-file with sweep specification')
+    parser.add_argument('--t', type=float, default=5000, help='calculation time')
+    parser.add_argument('--points', type=int, default=100, help='number of points in results of every case')
+    parser.add_argument('--out', default='results', help='directory for results')
+    parser.add_argument('--format', choices=['csv', 'npy'], default='csv', help='format of results of cases')
+    parser.add_argument('--processes', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--ensemble', action='store_true', 
+                        help='solve cases of every process as one ensemble ODE system')
+    args = parser.parse_args(argv)
+
+    fe_model = ObjFileParser.parse_obj_to_finite_element_model(args.model)
+    fe_model.read_params_from_file(args.params)
+    cases = read_sweep(args.sweep)
+    summaries = run_batch(fe_model, cases, args.t, args.out, args.points, args.format, args.processes, 
+                          args.ensemble)
+    failed = sum(summary["status"] != "ok" for summary in summaries)
+    print(f"{len(summaries) - failed} of {len(summaries)} cases are calculated, results are in {args.out}")
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
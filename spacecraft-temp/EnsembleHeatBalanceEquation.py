@@ -0,0 +1,85 @@
+import copy
+import numpy as np
+from scipy import sparse
+from scipy.integrate import solve_ivp
+from HeatBalanceEquation import *
+
+class EnsembleHeatBalanceEquation:
+    """
+    Heat balance equations of many parameter sets of one model integrated as a single ODE system.
+    The state of M members is stacked into the vector of size M * n_elem, member by member, 
+    so that the right-hand side of all members is evaluated by one sparse product 
+    and the Jacobian is block diagonal.
+    """
+
+    def __init__(self, fe_model: FiniteElementModel, members, a=0.1) -> None:
+        """
+        Initialization of the ensemble
+
+        Args:
+            fe_model (FiniteElementModel): model with base parameters
+            members (list of dicts): parameter overrides of every member in the format of json parameter files,
+                "A" sets the value of A in heat flux expressions
+            a (float, optional): value of A for members which do not override it. Defaults to 0.1.
+        """
+        self.fe_model = fe_model
+        self.n_members = len(members)
+        self.n_elem = fe_model.n_elem
+
+        operators, radiation_coeffs, coeffs, t0 = [], [], [], []
+        flux_groups = {}
+        for idx, overrides in enumerate(members):
+            member_model = copy.copy(fe_model)
+            member_model.set_params(overrides)
+            hbe = HeatBalanceEquation(member_model)
+            operators.append(sparse.csr_matrix(hbe.conduction_operator))
+            radiation_coeffs.append(hbe.radiation_coeffs)
+            coeffs.append(hbe.coeffs)
+            t0.append(np.asarray(member_model.t0, dtype=np.float64))
+            # members with the same heat flux expressions share one compiled function
+            key = tuple(str(expression) for expression in member_model.heat_fluxes)
+            flux_groups.setdefault(key, ([], []))
+            flux_groups[key][0].append(idx)
+            flux_groups[key][1].append(overrides.get("A", a))
+
+        self.conduction_operator = sparse.block_diag(operators, format='csr')
+        self.radiation_coeffs = np.concatenate(radiation_coeffs)
+        self.coeffs = np.stack(coeffs)
+        self.t0 = np.concatenate(t0)
+        self.flux_groups = [(np.array(idx), compile_ensemble_heat_fluxes(expressions, a_values)) 
+                            for expressions, (idx, a_values) in flux_groups.items()]
+
+    def heat_fluxes(self, t):
+        q = np.empty((self.n_members, self.n_elem))
+        for idx, fluxes in self.flux_groups:
+            q[idx] = fluxes(t)
+        return q
+
+    def equation(self, t, y):
+        return (self.conduction_operator @ y - self.radiation_coeffs * y ** 4 
+                + (self.heat_fluxes(t) / self.coeffs).ravel())
+
+    def jacobian(self, t, y):
+        return sparse.csr_matrix(self.conduction_operator + sparse.diags(-4 * self.radiation_coeffs * y ** 3))
+
+    def solve(self, t_span, t_eval=None, method='BDF', **kwargs):
+        """
+        Integrate all members at once
+
+        Args:
+            t_span (list of 2 floats): interval of integration
+            t_eval (np.array, optional): times to return results at. Defaults to the steps of the solver.
+            method (string, optional): method of solve_ivp. Defaults to 'BDF'.
+            kwargs: other arguments of solve_ivp
+
+        Returns:
+            np.array of shape (n_t,): time grid
+            np.array of shape (n_members, n_t, n_elem): temperatures of FE of every member
+        """
+        if method in ('BDF', 'Radau', 'LSODA'):
+            kwargs['jac'] = self.jacobian
+        sol = solve_ivp(fun=self.equation, t_span=t_span, y0=self.t0, method=method, t_eval=t_eval, **kwargs)
+        if not sol.success:
+            raise RuntimeError(sol.message)
+        y = sol.y.reshape(self.n_members, self.n_elem, -1).transpose(0, 2, 1)
+        return sol.t, y
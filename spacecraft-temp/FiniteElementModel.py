@@ -1,5 +1,6 @@
 import numpy as np
 import json
+from scipy import sparse
 
 class FiniteElementModel:
     """
@@ -14,42 +15,75 @@ class FiniteElementModel:
                  thermal_conductivity_matrix = None,
                  heat_fluxes = None,
                  coeffs = None,
-                 t0 = None) -> None:
+                 t0 = None,
+                 part_names = None) -> None:
         """
         Initialization of the finite element (FE) model
 
         Args:
             n_elem (int): count of elements in FEM
             full_surfaces (np.array of shape (n_obj,)): array of full surfaces of FE
-            intersection_matrix (np.array of shape (n_obj, n_obj)): matrix of surfaces of FE intersections
+            intersection_matrix (np.array or sparse matrix of shape (n_obj, n_obj)): matrix of surfaces of FE intersections
             emissivity (np.array of shape (n_obj,), optional): array of emissivity values of FE. Defaults to None.
-            thermal_conductivity_matrix (np.array of shape (n_obj, n_obj), optional): matrix of thermal . Defaults to None.
+            thermal_conductivity_matrix (np.array or sparse matrix of shape (n_obj, n_obj), optional): matrix of thermal 
+                conductivity of FE contacts. Defaults to None.
             heat_fluxes (np.array of shape (n_obj,), optional): array of heat flux functions for FE. Defaults to None.
             coeffs (np.array of shape (n_obj,), optional): array of coefficients for the heat balance equation for FE. Defaults to None.
             t0 (np.array of shape (n_obj,), optional): array of initial temperature values for FE. Defaults to None.
+            part_names (list of strings, optional): names of the model parts corresponding to FE. Defaults to None.
+
+        Both matrices are stored in CSR format, so that models with thousands of FE stay compact.
         """
         self.t0 = t0
         self.n_elem = n_elem
+        self.part_names = part_names
+        self.full_surfaces = full_surfaces
         self.coeffs = coeffs
         self.emissivity = emissivity
         self.heat_fluxes = heat_fluxes
-        self.intersection_matrix = intersection_matrix
-        self.thermal_conductivity_matrix = thermal_conductivity_matrix
-        self.surfaces = full_surfaces - np.sum(intersection_matrix, axis=0)
+        self.intersection_matrix = sparse.csr_matrix(intersection_matrix)
+        self.thermal_conductivity_matrix = sparse.csr_matrix(thermal_conductivity_matrix) \
+            if thermal_conductivity_matrix is not None else None
+        self.surfaces = full_surfaces - np.asarray(self.intersection_matrix.sum(axis=0)).ravel()
         
         
     def read_params_from_file(self, path) -> None:
         """
-        Read FE parameters for the heat balance equation from json-file by given path
+        Read FE parameters for the heat balance equation from json-file by given path.
+        Thermal conductivity is given either as a full matrix or, for large models, 
+        as a dict of "rows", "cols" and "values" of its nonzero entries.
 
         Args:
             path (string): path to json-file
         """        
         f = open(path)
         data = json.load(f)
-        self.t0 = np.array(data["t0"])
-        self.coeffs = np.array(data["coeffs"])
-        self.emissivity = np.array(data["emissivity"])
-        self.heat_fluxes = np.array(data["heat_fluxes"])
-        self.thermal_conductivity_matrix = np.array(data["thermal_conductivity"])
-        f.close()
\ No newline at end of file
+        self.set_params(data)
+        f.close()
+
+
+    def set_params(self, data) -> None:
+        """
+        Set FE parameters for the heat balance equation from dict in the format of json parameter files,
+        parameters missing in the dict stay unchanged
+
+        Args:
+            data (dict): parameters "t0", "coeffs", "emissivity", "heat_fluxes" and "thermal_conductivity"
+        """
+        if "t0" in data:
+            self.t0 = np.array(data["t0"])
+        if "coeffs" in data:
+            self.coeffs = np.array(data["coeffs"])
+        if "emissivity" in data:
+            self.emissivity = np.array(data["emissivity"])
+        if "heat_fluxes" in data:
+            self.heat_fluxes = np.array(data["heat_fluxes"])
+        if "thermal_conductivity" in data:
+            self.thermal_conductivity_matrix = self._read_matrix(data["thermal_conductivity"])
+
+
+    def _read_matrix(self, matrix) -> sparse.csr_matrix:
+        if isinstance(matrix, dict):
+            return sparse.coo_matrix((matrix["values"], (matrix["rows"], matrix["cols"])), 
+                                     shape=(self.n_elem, self.n_elem)).tocsr()
+        return sparse.csr_matrix(np.array(matrix, dtype=np.float64))
\ No newline at end of file
@@ -0,0 +1,121 @@
+import os
+import hashlib
+import zipfile
+import tempfile
+import numpy as np
+from scipy import sparse
+from pathlib import Path
+from FiniteElementModel import *
+
+class GeometryCache:
+    """
+    Disk cache of parsed finite element model geometry.
+    Entries are .npz files named by the hash of the model file contents and the parser version, 
+    least recently used entries are evicted when the cache grows beyond its size limit.
+    """
+
+    def __init__(self, cache_dir=None, max_size=256 * 1024 ** 2) -> None:
+        """
+        Initialization of the geometry cache
+
+        Args:
+            cache_dir (string, optional): directory to store cache entries in. Defaults to ~/.cache/spacecraft-temp.
+            max_size (int, optional): maximal total size of cache entries in bytes. Defaults to 256 MB.
+        """
+        self.cache_dir = Path(cache_dir) if cache_dir is not None \
+            else Path.home() / '.cache' / 'spacecraft-temp'
+        self.max_size = max_size
+
+    @staticmethod
+    def key(model_path, parser_version) -> str:
+        """
+        Hash of the model file contents and the parser version
+        """
+        digest = hashlib.sha256(f'parser-v{parser_version}\n'.encode())
+        with open(model_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 ** 2), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _entry_path(self, key) -> Path:
+        return self.cache_dir / f'{key}.npz'
+
+    def load(self, key):
+        """
+        Read finite element model geometry stored by given key
+
+        Returns:
+            FiniteElementModel or None if there is no such entry in cache
+        """
+        path = self._entry_path(key)
+        try:
+            with np.load(path) as data:
+                n_elem = int(data['n_elem'])
+                intersection_matrix = sparse.csr_matrix((data['intersection_data'], 
+                                                         data['intersection_indices'], 
+                                                         data['intersection_indptr']), 
+                                                        shape=(n_elem, n_elem))
+                fe_model = FiniteElementModel(n_elem,
+                                              data['full_surfaces'],
+                                              intersection_matrix,
+                                              part_names=list(data['part_names']))
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, KeyError, ValueError, zipfile.BadZipFile):
+            # a truncated or corrupt entry is a miss, it is removed to be stored again
+            path.unlink(missing_ok=True)
+            return None
+        # mark entry as recently used
+        os.utime(path)
+        return fe_model
+
+    def store(self, key, fe_model) -> None:
+        """
+        Save finite element model geometry by given key and evict old entries if the cache is full
+        """
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        part_names = fe_model.part_names if fe_model.part_names is not None else []
+        # write to temporary file first, so that readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f,
+                     n_elem=fe_model.n_elem,
+                     full_surfaces=fe_model.full_surfaces,
+                     intersection_data=fe_model.intersection_matrix.data,
+                     intersection_indices=fe_model.intersection_matrix.indices,
+                     intersection_indptr=fe_model.intersection_matrix.indptr,
+                     part_names=np.array(part_names, dtype=str))
+        os.replace(tmp_path, self._entry_path(key))
+        self.evict()
+
+    def entries(self):
+        """
+        List cache entries from the most to the least recently used
+
+        Returns:
+            list of tuples (key, size in bytes, last access time)
+        """
+        if not self.cache_dir.is_dir():
+            return []
+        entries = []
+        for path in self.cache_dir.glob('*.npz'):
+            stat = path.stat()
+            entries.append((path.stem, stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda entry: entry[2], reverse=True)
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self) -> None:
+        """
+        Remove least recently used entries until the cache fits into its size limit
+        """
+        total_size = 0
+        for key, size, _ in self.entries():
+            total_size += size
+            if total_size > self.max_size:
+                self._entry_path(key).unlink(missing_ok=True)
+
+    def clear(self) -> None:
+        for key, _, _ in self.entries():
+            self._entry_path(key).unlink(missing_ok=True)
@@ -1,58 +1,140 @@
 import numpy as np
-from scipy.integrate import solve_ivp
-from scipy.optimize import fsolve
+from scipy import sparse
 from FiniteElementModel import *
 from utils import * 
 
+# Stefan-Boltzmann constant in W / (m^2 * (100 K)^4)
+C0 = 5.67
+# Operators of smaller models are kept dense, since dense products are faster for them
+DENSE_OPERATOR_MAX_SIZE = 64
+
 class HeatBalanceEquation:
     def __init__(self, fe_model: FiniteElementModel) -> None:
         self.fe_model = fe_model
+        self.prepare_operators()
 
-    def equation(self, t, y, a=0.1):
-        Q_TC = np.zeros((self.fe_model.n_elem, self.fe_model.n_elem))
-
-        y_i = np.tile(y, (5, 1))
-        y_j = y_i.T
+    def prepare_operators(self) -> None:
+        """
+        Precompute operators of the right-hand side from the current FE model parameters.
+        Must be called again if the parameters of the model are changed.
+        """
+        coeffs = np.asarray(self.fe_model.coeffs, dtype=np.float64)
 
-        k_ij = self.fe_model.thermal_conductivity_matrix * self.fe_model.intersection_matrix
+        # Q_TC_i = sum_j k_ij * (T_j - T_i), i.e. conduction is a Laplacian-style matrix
+        k_ij = sparse.csr_matrix(self.fe_model.thermal_conductivity_matrix).multiply(
+            self.fe_model.intersection_matrix)
+        conduction = k_ij - sparse.diags(np.asarray(k_ij.sum(axis=1)).ravel())
 
-        Q_TC += k_ij * (y_i - y_j)
+        # Q_E_i = - e_i * S_i * C0 * (T_i / 100) ** 4
+        radiation = self.fe_model.emissivity * self.fe_model.surfaces * C0 / 100 ** 4
 
-        c0 = 5.67
-        Q_E = - self.fe_model.emissivity * self.fe_model.surfaces * c0 * ((y / 100) ** 4)
-        Q_R = np.array([string_to_function(str_fun, a) 
-                        for str_fun in self.fe_model.heat_fluxes]) 
+        self.conduction_operator = sparse.diags(1 / coeffs) @ conduction
+        self.is_sparse = self.fe_model.n_elem > DENSE_OPERATOR_MAX_SIZE
+        self.conduction_operator = sparse.csr_matrix(self.conduction_operator) if self.is_sparse \
+            else self.conduction_operator.toarray()
+        self.radiation_coeffs = radiation / coeffs
+        self.coeffs = coeffs
+        self._heat_fluxes = {}
 
-        eq = (np.sum(Q_TC, axis=1) + Q_E + 
-              np.array([Q_R_i(t) for Q_R_i in Q_R])) / self.fe_model.coeffs
+    def heat_fluxes(self, t, a=0.1):
+        # expressions are compiled once for every value of A
+        if a not in self._heat_fluxes:
+            self._heat_fluxes[a] = compile_heat_fluxes(self.fe_model.heat_fluxes, a)
+        return self._heat_fluxes[a](t)
 
-        return eq
+    def equation(self, t, y, a=0.1):
+        return (self.conduction_operator @ y - self.radiation_coeffs * y ** 4 
+                + self.heat_fluxes(t, a) / self.coeffs)
     
-    def steady_eq(self, y, t, a=0.1):
-        Q_TC = np.zeros((self.fe_model.n_elem, self.fe_model.n_elem))
+    def jacobian(self, t, y, a=0.1):
+        """
+        Analytic Jacobian of the right-hand side: conduction operator and diagonal radiation term
+        """
+        radiation = sparse.diags(-4 * self.radiation_coeffs * y ** 3)
+        if self.is_sparse:
+            return sparse.csr_matrix(self.conduction_operator + radiation)
+        return self.conduction_operator + radiation.toarray()
+
+    def solve(self, t_span, y0, a=0.1, method='BDF', **kwargs):
+        """
+        Integrate the heat balance equation with implicit method using the analytic Jacobian
+
+        Args:
+            t_span (list of 2 floats): interval of integration
+            y0 (np.array of shape (n_obj,)): initial temperatures of FE
+            a (float, optional): value of A in heat flux expressions. Defaults to 0.1.
+            method (string, optional): method of solve_ivp, 'BDF' or 'Radau'. Defaults to 'BDF'.
+            kwargs: other arguments of solve_ivp
+        """
+        from scipy.integrate import solve_ivp
+        return solve_ivp(fun=self.equation, 
+                         t_span=t_span, 
+                         y0=y0, 
+                         method=method, 
+                         jac=self.jacobian, 
+                         args=(a,), 
+                         **kwargs)
+
+    def steady_initial_guess(self, t, a=0.1):
+        """
+        Uniform temperature at which the total radiation balances the total heat flux
+        """
+        q = np.sum(self.heat_fluxes(t, a))
+        radiation = np.sum(self.radiation_coeffs * self.coeffs)
+        t_uniform = (q / radiation) ** 0.25 if q > 0 and radiation > 0 else 0.0
+        return np.full(self.fe_model.n_elem, max(t_uniform, 1.0))
+
+    def steady_state(self, t, y0=None, a=0.1, tol=1e-10, max_iter=100):
+        """
+        Solve the steady heat balance equation at time t by damped Newton method with analytic Jacobian
 
-        y_i = np.tile(y, (5, 1))
-        y_j = y_i.T
+        Args:
+            t (float): time to evaluate heat fluxes at
+            y0 (np.array of shape (n_obj,), optional): initial guess. Defaults to uniform temperature guess.
+            a (float, optional): value of A in heat flux expressions. Defaults to 0.1.
+            tol (float, optional): relative tolerance of Newton steps. Defaults to 1e-10.
+            max_iter (int, optional): maximal number of Newton iterations. Defaults to 100.
 
-        k_ij = self.fe_model.thermal_conductivity_matrix * self.fe_model.intersection_matrix
+        Returns:
+            np.array of shape (n_obj,): steady temperatures of FE
 
-        Q_TC += k_ij * (y_i - y_j)
+        Raises:
+            RuntimeError: if Newton method does not converge in max_iter iterations
+        """
+        from scipy.sparse.linalg import spsolve
+        y = self.steady_initial_guess(t, a) if y0 is None else np.array(y0, dtype=np.float64)
+        f = self.equation(t, y, a)
+        for _ in range(max_iter):
+            jac = self.jacobian(t, y, a)
+            dy = spsolve(jac.tocsc(), -f) if self.is_sparse else np.linalg.solve(jac, -f)
+            # halve the step until the residual decreases
+            step = 1.0
+            while True:
+                y_new = y + step * dy
+                f_new = self.equation(t, y_new, a)
+                if np.linalg.norm(f_new) < np.linalg.norm(f) or step < 1e-3:
+                    break
+                step /= 2
+            y, f = y_new, f_new
+            if np.max(np.abs(step * dy)) <= tol * (1 + np.max(np.abs(y))):
+                return y
+        raise RuntimeError(f'Steady state at t = {t} did not converge in {max_iter} Newton iterations, '
+                           f'residual {np.linalg.norm(f):.3e}')
 
-        c0 = 5.67
-        Q_E = - self.fe_model.emissivity * self.fe_model.surfaces * c0 * ((y / 100) ** 4)
-        Q_R = np.array([string_to_function(str_fun, a) 
-                        for str_fun in self.fe_model.heat_fluxes]) 
-        eq = (np.sum(Q_TC, axis=1) + Q_E + 
-              np.array([Q_R_i(t) for Q_R_i in Q_R])) / self.fe_model.coeffs
+    def steady_solutions(self, t, a=0.1):
+        """
+        Steady temperatures for every time of given grid, each solve starts from the previous solution
 
-        return eq
-    def steady_solve(self, var, t):
-        sol = fsolve(self.steady_eq, x0=var, args=(t, 50))
-        return sol
+        Returns:
+            np.array of shape (len(t), n_obj): steady temperatures of FE
+        """
+        solutions = np.empty((len(t), self.fe_model.n_elem))
+        y = None
+        for idx, t_i in enumerate(t):
+            y = self.steady_state(t_i, y0=y, a=a)
+            solutions[idx] = y
+        return solutions
     
-    def steady_solution(self):
-        x0 = np.random.randint(150,size=5)
+    def steady_solution(self, a=50):
         t = np.linspace(0, 100, 100)
-        vfunc = np.vectorize(self.steady_solve, excluded=['var'], otypes=[list])
-        sol = vfunc(var=x0, t=t)
-        return sol[-1]
\ No newline at end of file
+        return self.steady_solutions(t, a)[-1]
@@ -0,0 +1,113 @@
+import numpy as np
+from scipy.integrate import BDF, Radau, RK45
+from HeatBalanceEquation import *
+
+SOLVERS = {'BDF': BDF, 'Radau': Radau, 'RK45': RK45}
+
+class IntegratorSession:
+    """
+    Persistent integration of the heat balance equation.
+    The solver keeps its state and step size between calls, so that every chunk of results 
+    costs only the integration from the last reached time.
+    """
+
+    def __init__(self, hbe: HeatBalanceEquation, y0, t0=0.0, a=0.1, method='BDF', t_bound=np.inf, **options) -> None:
+        """
+        Initialization of the integrator session
+
+        Args:
+            hbe (HeatBalanceEquation): equation to integrate
+            y0 (np.array of shape (n_obj,)): initial temperatures of FE
+            t0 (float, optional): initial time. Defaults to 0.
+            a (float, optional): value of A in heat flux expressions. Defaults to 0.1.
+            method (string, optional): 'BDF', 'Radau' or 'RK45'. Defaults to 'BDF'.
+            t_bound (float, optional): time integration can not go beyond. Defaults to infinity.
+            options: other options of the solver, e.g. rtol and atol
+        """
+        fun = lambda t, y: hbe.equation(t, y, a)
+        if method in ('BDF', 'Radau'):
+            options['jac'] = lambda t, y: hbe.jacobian(t, y, a)
+        self.solver = SOLVERS[method](fun, t0, np.array(y0, dtype=np.float64), t_bound, **options)
+        # time of the last returned result
+        self.t = t0
+        self.y = self.solver.y.copy()
+        self.n_steps = 0
+        # the initial point is returned once, in the first non-empty chunk
+        self._initial_emitted = False
+
+    def advance(self, t_end, n_points=100, cancel=None):
+        """
+        Integrate up to t_end and return results on uniform grid after the last returned time, 
+        the first call also returns the initial point
+
+        Args:
+            t_end (float): time to integrate to
+            n_points (int, optional): number of grid points. Defaults to 100.
+            cancel (threading.Event, optional): token checked between solver steps, 
+                if it is set only the already reached points are returned. Defaults to None.
+
+        Returns:
+            np.array of shape (n_points,): time grid
+            np.array of shape (n_points, n_obj): temperatures of FE on the grid
+        """
+        if not self._initial_emitted:
+            t = np.linspace(self.t, t_end, n_points)
+        else:
+            t = np.linspace(self.t, t_end, n_points + 1)[1:]
+        y = np.empty((t.shape[0], self.y.shape[0]))
+
+        idx = 0
+        while idx < t.shape[0]:
+            # points already reached by the solver are interpolated by the last step
+            while idx < t.shape[0] and t[idx] <= self.solver.t:
+                y[idx] = self.y if t[idx] == self.t else self._interpolate(t[idx])
+                idx += 1
+            if idx == t.shape[0]:
+                break
+            if cancel is not None and cancel.is_set():
+                t, y = t[:idx], y[:idx]
+                break
+            message = self.solver.step()
+            self.n_steps += 1
+            if self.solver.status == 'failed':
+                raise RuntimeError(f'Integration failed at t = {self.solver.t}: {message}')
+            self._dense_output = self.solver.dense_output()
+
+        if t.shape[0] > 0:
+            self.t = t[-1]
+            self.y = y[-1].copy()
+            self._initial_emitted = True
+        return t, y
+
+    def _interpolate(self, t):
+        if t == self.solver.t:
+            return self.solver.y
+        return self._dense_output(t)
+
+    def statistics(self) -> dict:
+        """
+        Counters of the solver work done so far: accepted and rejected steps, right hand side and 
+        jacobian evaluations, LU decompositions. Rejected steps are None where they can not be derived
+        """
+        stats = {
+            'accepted_steps': self.n_steps,
+            'rejected_steps': None,
+            'rhs_calls': self.solver.nfev,
+            'jacobian_calls': self.solver.njev,
+            'lu_decompositions': self.solver.nlu
+        }
+        if isinstance(self.solver, RK45):
+            # every attempted step of RK45 costs n_stages evaluations, 2 more are spent on the first step
+            attempts = max(self.solver.nfev - 2, 0) // self.solver.n_stages
+            stats['rejected_steps'] = max(attempts - self.n_steps, 0)
+        # BDF and Radau retry rejected steps inside one call of step() with the step size kept in local 
+        # variables, and their Newton iterations make the counts of evaluations and LU decompositions 
+        # per attempt vary, so rejections can not be told from the outside
+        return stats
+
+    def chunks(self, t_step, n_points=100, t_max=np.inf, cancel=None):
+        """
+        Generate results by chunks of t_step time units until t_max or cancellation
+        """
+        while self.t < t_max and not (cancel is not None and cancel.is_set()):
+            yield self.advance(min(self.t + t_step, t_max), n_points, cancel)
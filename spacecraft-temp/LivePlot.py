@@ -0,0 +1,171 @@
+import numpy as np
+
+class MinMaxBins:
+    """
+    Minimum and maximum of every line in bins of equal width along x, 
+    so that the plotted lines look the same at screen resolution as the full series.
+    Bins are updated by new points only, so the cost of a chunk does not depend on the length of history.
+    """
+
+    def __init__(self, x0, x1, n_bins, n_lines) -> None:
+        """
+        Args:
+            x0 (float): left bound of the first bin
+            x1 (float): right bound of the last bin
+            n_bins (int): number of bins, usually width of axes in pixels
+            n_lines (int): number of lines
+        """
+        self.x0 = x0
+        self.x1 = x1
+        self.width = (x1 - x0) / n_bins
+        self.n_bins = n_bins
+        self.y_min = np.full((n_bins, n_lines), np.inf)
+        self.y_max = np.full((n_bins, n_lines), -np.inf)
+        self.x_min = np.zeros((n_bins, n_lines))
+        self.x_max = np.zeros((n_bins, n_lines))
+        self.filled = np.zeros(n_bins, dtype=bool)
+
+    def add(self, x, y):
+        """
+        Add points to the bins they fall in
+
+        Args:
+            x (np.array of shape (n,)): x values
+            y (np.array of shape (n, n_lines)): y values of all lines
+        """
+        bins = np.clip(((x - self.x0) / self.width).astype(np.int64), 0, self.n_bins - 1)
+        np.minimum.at(self.y_min, bins, y)
+        np.maximum.at(self.y_max, bins, y)
+        # positions of extrema are taken from the points reaching them
+        rows, lines = np.nonzero(y == self.y_min[bins])
+        self.x_min[bins[rows], lines] = x[rows]
+        rows, lines = np.nonzero(y == self.y_max[bins])
+        self.x_max[bins[rows], lines] = x[rows]
+        self.filled[bins] = True
+
+    def line(self, idx):
+        """
+        Points of a line, minimum and maximum of every filled bin in order of x
+
+        Returns:
+            np.array of shape (n_points,): x values
+            np.array of shape (n_points,): y values
+        """
+        filled = self.filled
+        x_min, x_max = self.x_min[filled, idx], self.x_max[filled, idx]
+        y_min, y_max = self.y_min[filled, idx], self.y_max[filled, idx]
+        first = x_min <= x_max
+        x = np.column_stack((np.where(first, x_min, x_max), np.where(first, x_max, x_min))).ravel()
+        y = np.column_stack((np.where(first, y_min, y_max), np.where(first, y_max, y_min))).ravel()
+        # bins with a single point give it once
+        keep = np.ones(x.shape[0], dtype=bool)
+        keep[1::2] = x_min != x_max
+        return x[keep], y[keep]
+
+class LivePlot:
+    """
+    Plot of temperature histories growing by chunks.
+    Keeps one line per FE and data in growable buffers, redraws only the lines by blitting, 
+    so that the cost of redraw depends on the width of the plot rather than on the length of history.
+    """
+
+    def __init__(self, canvas, labels, capacity=1024) -> None:
+        """
+        Args:
+            canvas (MplCanvas): canvas to draw on
+            labels (list of strings): labels of lines
+            capacity (int, optional): initial size of buffers. Defaults to 1024.
+        """
+        self.canvas = canvas
+        self.axes = canvas.axes
+        self.canvas.clear()
+        self.lines = [self.axes.plot([], [], label=label, animated=True)[0] for label in labels]
+        self.axes.set_xlabel('t')
+        self.axes.set_title('Heat Equation')
+        self.axes.legend(shadow=True, loc='upper right')
+
+        self.size = 0
+        self.y_min = np.inf
+        self.y_max = -np.inf
+        self._t = np.empty(capacity)
+        self._y = np.empty((capacity, len(labels)))
+        self.bins = None
+        self.background = None
+
+        self._draw_cid = self.canvas.mpl_connect('draw_event', self._on_draw)
+        self.canvas.draw()
+
+    @property
+    def t(self):
+        return self._t[:self.size]
+
+    @property
+    def y(self):
+        return self._y[:self.size]
+
+    def close(self):
+        self.canvas.mpl_disconnect(self._draw_cid)
+
+    def append(self, t, y):
+        """
+        Add chunk of results and redraw the plot
+        """
+        n = t.shape[0]
+        if n == 0:
+            return
+        if self.size + n > self._t.shape[0]:
+            capacity = max(2 * self._t.shape[0], self.size + n)
+            self._t = np.resize(self._t, capacity)
+            self._y = np.resize(self._y, (capacity, self._y.shape[1]))
+        self._t[self.size:self.size + n] = t
+        self._y[self.size:self.size + n] = y
+        self.size += n
+        self.y_min = min(self.y_min, np.min(y))
+        self.y_max = max(self.y_max, np.max(y))
+
+        limits_changed = self._update_limits()
+        self._update_lines(t, y)
+        if limits_changed:
+            # limits changed, the background is redrawn and lines are blitted on draw event
+            self.canvas.draw()
+        else:
+            self._blit()
+
+    def _update_lines(self, t, y):
+        n_bins = max(int(self.axes.bbox.width), 1)
+        x0, x1 = self.axes.get_xlim()
+        if self.bins is None or (self.bins.x0, self.bins.x1, self.bins.n_bins) != (x0, x1, n_bins):
+            # x range or width of the plot changed, the whole history is binned again
+            self.bins = MinMaxBins(x0, x1, n_bins, len(self.lines))
+            t, y = self.t, self.y
+        self.bins.add(t, y)
+        for idx, line in enumerate(self.lines):
+            line.set_data(*self.bins.line(idx))
+
+    def _update_limits(self) -> bool:
+        # limits grow with margin, so that the full redraw is needed only from time to time
+        t_min, t_max = self._t[0], self._t[self.size - 1]
+        (x0, x1), (y0, y1) = self.axes.get_xlim(), self.axes.get_ylim()
+        changed = False
+        if t_min != x0 or t_max > x1:
+            self.axes.set_xlim(t_min, t_min + 1.5 * max(t_max - t_min, 1.0))
+            changed = True
+        if self.y_min < y0 or self.y_max > y1:
+            margin = 0.1 * max(self.y_max - self.y_min, 1.0)
+            self.axes.set_ylim(self.y_min - margin, self.y_max + margin)
+            changed = True
+        return changed
+
+    def _on_draw(self, event):
+        self.background = self.canvas.copy_from_bbox(self.axes.bbox)
+        for line in self.lines:
+            self.axes.draw_artist(line)
+
+    def _blit(self):
+        if self.background is None:
+            self.canvas.draw()
+            return
+        self.canvas.restore_region(self.background)
+        for line in self.lines:
+            self.axes.draw_artist(line)
+        self.canvas.blit(self.axes.bbox)
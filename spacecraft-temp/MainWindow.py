@@ -13,22 +13,30 @@ from PyQt6.QtWidgets import (
 from PyQt6.QtCore import QThread
 from Worker import *
 from HeatBalanceEquation import *
-from scipy.integrate import solve_ivp
+from SolverWorker import *
 from MplCanvas import *
+from LivePlot import *
 from PyQt6.QtCore import *
 from PyQt6.QtGui import *
 from PyQt6.QtWidgets import *
-from csv import writer
 
 
 class MainWindow(QMainWindow):
     def __init__(self):
         # ------ FINITE ELEMENT MODEL LOGIC ------
         self.save_file_path = '..'
-        self.save_file_name = '/results.csv'
+        self.save_file_name = '/results'
+        self.save_file_format = 'csv'
         self.fe_model = None
-        self.stop = False
+        self.solver_worker = None
+        self.live_plot = None
         self.init_value_mode = 'config'
+        # profiling is opt-in, a new profiler is created for every parse and run,
+        # each kept apart so a run started during parsing does not replace the parse profile
+        self.profiling = False
+        self.profiling_capture = False
+        self.parse_profiler = NO_PROFILER
+        self.run_profiler = NO_PROFILER
         # ------ USER INTERFACE LOGIC ------
         super().__init__()
         self.setWindowTitle("Spacecraft Temperature Distribution")
@@ -68,6 +76,11 @@ class MainWindow(QMainWindow):
         self.solution_graphics = MplCanvas(self, width=5, height=4, dpi=100)
         stop_calculation_button = QPushButton("Stop calculations")
         stop_calculation_button.clicked.connect(self.stop_calculations)
+        # Profiling status panel
+        self.profile_status = QPlainTextEdit()
+        self.profile_status.setReadOnly(True)
+        self.profile_status.setMaximumHeight(120)
+        self.profile_status.setPlaceholderText("Turn on profiling in Settings to see statistics of runs.")
         # ------ LAYOUT ------
         layout = QGridLayout()
         # Model
@@ -92,13 +105,26 @@ class MainWindow(QMainWindow):
         layout.addWidget(start_calculation_button, 7, 0, 1, 2)
         layout.addWidget(stop_calculation_button, 7, 2, 1, 2)
         layout.addWidget(self.solution_graphics, 8, 0, 1, 4)
+        layout.addWidget(self.profile_status, 9, 0, 1, 4)
 
         # ------ MENU ------
         bar = self.menuBar()
         settings = bar.addMenu("Settings")
         save_action = QAction("Save temperatures to..", self)
+        save_action.triggered.connect(self.save_path_update)
         settings.addAction(save_action)
-        settings.triggered[QAction].connect(self.save_path_update)
+        binary_action = QAction("Save temperatures in binary format (.npy)", self)
+        binary_action.setCheckable(True)
+        binary_action.toggled.connect(self.save_format_update)
+        settings.addAction(binary_action)
+        profile_action = QAction("Profile calculations", self)
+        profile_action.setCheckable(True)
+        profile_action.toggled.connect(self.profiling_update)
+        settings.addAction(profile_action)
+        capture_action = QAction("Capture cProfile and memory statistics", self)
+        capture_action.setCheckable(True)
+        capture_action.toggled.connect(self.profiling_capture_update)
+        settings.addAction(capture_action)
 
         # ------ CONTAINER ------
         container = QWidget()
@@ -117,6 +143,36 @@ class MainWindow(QMainWindow):
             print(self.save_file_path)
 
 
+    def save_format_update(self, binary):
+        self.save_file_format = 'npy' if binary else 'csv'
+
+
+    def profiling_update(self, enabled):
+        self.profiling = enabled
+
+
+    def profiling_capture_update(self, enabled):
+        self.profiling_capture = enabled
+
+
+    def new_profiler(self):
+        if not self.profiling:
+            return NO_PROFILER
+        return Profiler(cprofile=self.profiling_capture, memory=self.profiling_capture)
+
+
+    def show_profile(self, profiler, title, suffix):
+        if not profiler.enabled:
+            return
+        self.profile_status.setPlainText(f"== {title} ==\n{profiler.summary()}")
+        try:
+            path = f'{self.save_file_path}{self.save_file_name}_{suffix}.json'
+            profiler.to_json(path)
+            self.profile_status.appendPlainText(f"Saved to {path}")
+        except OSError as e:
+            self.profile_status.appendPlainText(f"Profile is not saved: {e}")
+
+
     def open_file_dialog_model(self):
         filename, _ = QFileDialog.getOpenFileName(
             self,
@@ -158,7 +214,8 @@ class MainWindow(QMainWindow):
         # Create a QThread object
         self.thread = QThread()
         # Create a worker object
-        self.worker = Worker(self.fe_model, path)
+        self.parse_profiler = self.new_profiler()
+        self.worker = Worker(self.fe_model, path, self.parse_profiler)
         # Move worker to the thread
         self.worker.moveToThread(self.thread)
         # Connect signals and slots
@@ -177,6 +234,7 @@ class MainWindow(QMainWindow):
         self.loading_window.stop_animation()
         self.model_ready_input_label.setText("Model is successfully loaded and parsed!")
         self.model_ready_input_label.setStyleSheet('color: green')
+        self.show_profile(self.parse_profiler, "Model parsing", "parse_profile")
 
 
     def set_infinite_time(self):
@@ -210,60 +268,59 @@ class MainWindow(QMainWindow):
         else:
             self.init_value_mode = None
     
-    def write_title(self):
-        with open(self.save_file_path + self.save_file_name, 'a') as f_object:
-            writer_object = writer(f_object)
-            writer_object.writerow(['t', 'T1', 'T2', 'T3', 'T4', 'T5'])
-            f_object.close()
-
     def start_calculations(self):
-        self.write_title()
+        # only one calculation at a time
+        if self.solver_worker is not None:
+            return
         t_max = self.time_input.text()
-        self.y = np.empty((0,5))
-        self.solution_graphics.axes.cla()
+        labels = [f'T{idx + 1}' for idx in range(self.fe_model.n_elem)]
+        if self.live_plot is not None:
+            self.live_plot.close()
+        self.live_plot = LivePlot(self.solution_graphics, labels)
+        # Results file is owned by the worker for the whole run
+        results_writer = ResultsWriter(f'{self.save_file_path}{self.save_file_name}.{self.save_file_format}', 
+                                       self.fe_model.n_elem, self.save_file_format)
+        self.run_profiler = self.new_profiler()
+        # Create a QThread object
+        self.solver_thread = QThread()
+        # Create a worker object, finite runs are calculated by one chunk
         if t_max == 'Infinite':
-            t_step = 100
-            t0 = 0
-            t_max = 100
-            while(not self.stop and t_max < 50000):
-                t_max = t0 + t_step
-                self.calculate_and_draw(t0, t_max, 
-                                        y_prev=(None if t0 == 0 else self.y[-1]),
-                                        N=t_max)
-                t0 = t_max
+            self.solver_worker = SolverWorker(self.fe_model, 50000, self.init_value_mode, t_step=100, 
+                                              results_writer=results_writer, profiler=self.run_profiler)
         else:
-            t_max = int(t_max)
-            self.calculate_and_draw(0, t_max)
+            self.solver_worker = SolverWorker(self.fe_model, int(t_max), self.init_value_mode, t_step=int(t_max), 
+                                              results_writer=results_writer, profiler=self.run_profiler)
+        # Move worker to the thread
+        self.solver_worker.moveToThread(self.solver_thread)
+        # Connect signals and slots
+        self.solver_thread.started.connect(self.solver_worker.run)
+        self.solver_worker.chunk_ready.connect(self.draw_solution)
+        self.solver_worker.error.connect(self.calculations_failed)
+        self.solver_worker.finished.connect(self.solver_thread.quit)
+        self.solver_worker.finished.connect(self.solver_worker.deleteLater)
+        self.solver_thread.finished.connect(self.solver_thread.deleteLater)
+        self.solver_thread.finished.connect(self.calculations_finished)
+        # Start the thread
+        self.solver_thread.start()
 
     
     def stop_calculations(self):
-        self.stop = True
+        if self.solver_worker is not None:
+            self.solver_worker.cancel()
+
+
+    def calculations_finished(self):
+        self.solver_worker = None
+        self.solver_thread = None
+        self.show_profile(self.run_profiler, "Calculations", "profile")
+
+
+    def calculations_failed(self, message):
+        QMessageBox.critical(self, "Calculation error", message)
    
 
-    def calculate_and_draw(self, t0, t_max, y_prev = None, N = 100):
-        hbe = HeatBalanceEquation(self.fe_model)
-        y0 = y_prev if y_prev is not None \
-            else self.fe_model.t0 if self.init_value_mode == 'config' else hbe.steady_solution()
-        eq = hbe.equation
-        sol = solve_ivp(fun=eq, 
-                t_span=[0, t_max], 
-                y0=y0, 
-                args=(50,),
-                dense_output=True)
-        t = np.linspace(t0, t_max, 100)
-        y = sol.sol(t).T
-        y_col = np.round(y, 3)
-        rows = zip(np.round(t, 2), y_col[:, 0], y_col[:, 1], y_col[:, 2], y_col[:, 3], y_col[:, 4])
-        with open(self.save_file_path + self.save_file_name, 'a') as f_object:
-            for row in rows:
-                writer_object = writer(f_object)
-                writer_object.writerow(row)
-            f_object.close()
-        self.y = np.concatenate([self.y, y])
-        t_full = np.linspace(0, t_max, N)
-        self.solution_graphics.axes.plot(t_full, self.y)
-        self.solution_graphics.axes.set_xlabel('t')
-        self.solution_graphics.axes.legend(['T1', 'T2', 'T3', 'T4', 'T5'], shadow=True)
-        self.solution_graphics.axes.set_title('Heat Equation')
-        self.solution_graphics.draw()
-        self.solution_graphics.flush_events()
+    def draw_solution(self, t, y):
+        with self.run_profiler.stage('plot'):
+            self.live_plot.append(t, y)
+        if self.solver_worker is not None:
+            self.solver_worker.chunk_consumed()
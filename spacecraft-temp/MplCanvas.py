@@ -1,12 +1,15 @@
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
-import matplotlib.pyplot as plt
 
 
 class MplCanvas(FigureCanvas):
 
     def __init__(self, parent=None, width=5, height=4, dpi=100):
-        plt.gca().set_prop_cycle(color=['red', 'green', 'blue', 'yellow', 'orange'])
         fig = Figure(figsize=(width, height), dpi=dpi)
         self.axes = fig.add_subplot(111)
-        super(MplCanvas, self).__init__(fig)
\ No newline at end of file
+        self.clear()
+        super(MplCanvas, self).__init__(fig)
+
+    def clear(self):
+        self.axes.cla()
+        self.axes.set_prop_cycle(color=['red', 'green', 'blue', 'yellow', 'orange'])
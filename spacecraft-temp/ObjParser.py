@@ -1,63 +1,56 @@
 from utils import *
 from FiniteElementModel import *
-from pywavefront import Wavefront
+from Profiler import *
+
+# Bump whenever parsing changes results, so that cached geometry gets invalidated
+PARSER_VERSION = 4
 
 class ObjFileParser:
 
     @staticmethod
-    def parse_obj_to_finite_element_model(model_path, log_to_console=False) -> FiniteElementModel:
-        # Specify the input and output file paths
-        input_obj_file = model_path
-        output_obj_file = model_path
-        # Prepare .obj file for correct parse by Wavefront package
-        replace_g_with_o(input_obj_file, output_obj_file)
-        
-        # Load the Wavefront object
-        obj_file_path =  model_path
-        wavefront = Wavefront(obj_file_path, collect_faces=True)
-
-        n_obj = wavefront.mesh_list.__len__()
-
-        intersection_matrix = np.zeros((n_obj, n_obj))
-        full_surfaces = np.zeros(n_obj)
-
-        # fix enumeration 
-        mesh_list = np.array(wavefront.mesh_list)
-        mesh_list[[2, 3]] = mesh_list[[3, 2]]
-
-        # Iterate over each object in the mesh list
-        for obj_idx, obj in enumerate(mesh_list):
-            obj_vertices = wavefront.vertices
-            obj_faces = obj.faces
-
-            obj_surface_area = calculate_surface_area(obj_vertices, obj_faces)
-            if log_to_console: print(f"Full surface area of Object {obj_idx + 1}: {obj_surface_area}")
-
-            full_surfaces[obj_idx] = obj_surface_area
+    def parse_obj_to_finite_element_model(model_path, log_to_console=False, cache=None, 
+                                          profiler=NO_PROFILER) -> FiniteElementModel:
+        # Look up already parsed geometry of the same file
+        if cache is not None:
+            with profiler.stage('cache_lookup'):
+                cache_key = cache.key(model_path, PARSER_VERSION)
+                fe_model = cache.load(cache_key)
+            if fe_model is not None:
+                profiler.count('cache_hits')
+                if log_to_console: print(f"Model geometry is loaded from cache: {cache_key}")
+                return fe_model
+
+        # Read vertices and faces of all parts
+        with profiler.stage('read_obj'):
+            vertices, part_names, part_faces = read_obj(model_path)
+
+        n_obj = len(part_names)
+
+        # Order parts by their names, so that element indices follow the part numbering
+        order = sorted(range(n_obj), key=lambda idx: part_sort_key(part_names[idx]))
+        part_names = [part_names[idx] for idx in order]
+
+        # Join faces into one array and compute all face areas in one pass
+        with profiler.stage('surface_areas'):
+            faces, part_bounds = mesh_to_arrays([part_faces[idx] for idx in order])
+            face_areas = triangle_areas(vertices, faces)
+            face_axes, face_values = axis_aligned_planes(vertices, faces)
+            face_lower, face_upper = triangle_bounds(vertices, faces)
+            full_surfaces = calculate_surface_areas(face_areas, part_bounds)
+        profiler.count('parts', n_obj)
+        profiler.count('faces_processed', faces.shape[0])
 
-            start_idx = obj_idx - 1 if obj_idx > 0 else 0
-
-            # Calculate intersection area with other objects
-            for other_obj_idx, other_obj in enumerate(mesh_list[start_idx:obj_idx+2]):
-                other_obj_vertices = wavefront.vertices
-                other_obj_faces = other_obj.faces
-                other_obj_idx = other_obj_idx + start_idx
-
-                if (obj_idx == other_obj_idx):
-                    intersection_matrix[obj_idx, other_obj_idx] = 0
-                    continue
-
-                intersection_area = calculate_intersection_area(obj_vertices, obj_faces, other_obj_vertices, other_obj_faces)
-
-                if intersection_matrix[obj_idx, other_obj_idx] == 0:
-                    intersection_matrix[obj_idx, other_obj_idx] = intersection_area
-                elif intersection_matrix[obj_idx, other_obj_idx] > intersection_area:
-                    intersection_matrix[obj_idx, other_obj_idx] = intersection_area
+        if log_to_console: 
+            for obj_idx in range(n_obj):
+                print(f"Full surface area of Object {obj_idx + 1}: {full_surfaces[obj_idx]}")
 
-                if intersection_matrix[other_obj_idx, obj_idx] == 0:
-                    intersection_matrix[other_obj_idx, obj_idx] = intersection_area
-                elif intersection_matrix[other_obj_idx, obj_idx] > intersection_area:
-                    intersection_matrix[other_obj_idx, obj_idx] = intersection_area
+        # Find all touching parts through the index of axis-aligned planes
+        with profiler.stage('contacts'):
+            contact_index = build_contact_index(face_areas, face_axes, face_values, face_lower, face_upper, 
+                                                part_bounds)
+            intersection_matrix = calculate_intersection_matrix(contact_index, n_obj)
+        profiler.count('contact_planes', len(contact_index))
+        profiler.count('contact_pairs_tested', sum(len(parts) * (len(parts) - 1) // 2 for parts in contact_index.values()))
 
         if log_to_console: 
             print("== Intersection matrix ==")
@@ -66,4 +59,10 @@ class ObjFileParser:
                     print(f"{str(intersection_matrix[i, j])[:5]}", end=" ")
                 print('\n')
 
-        return FiniteElementModel(n_obj, full_surfaces, intersection_matrix)
\ No newline at end of file
+        fe_model = FiniteElementModel(n_obj, full_surfaces, intersection_matrix, 
+                                      part_names=part_names)
+        if cache is not None:
+            with profiler.stage('cache_store'):
+                cache.store(cache_key, fe_model)
+
+        return fe_model
\ No newline at end of file
@@ -0,0 +1,127 @@
+import io
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+class Profiler:
+    """
+    Opt-in collector of wall-clock timers and counters of the thermal pipeline.
+    A disabled profiler does nothing, so that it can be passed to every stage at no cost.
+    """
+
+    def __init__(self, enabled=True, cprofile=False, memory=False) -> None:
+        """
+        Args:
+            enabled (bool, optional): collect timers and counters. Defaults to True.
+            cprofile (bool, optional): capture cProfile statistics of captured blocks. Defaults to False.
+            memory (bool, optional): capture tracemalloc statistics of captured blocks. Defaults to False.
+        """
+        self.enabled = enabled
+        self.cprofile = enabled and cprofile
+        self.memory = enabled and memory
+        self.timers = {}
+        self.counters = {}
+        self.captures = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Measure wall-clock time of the block, times of stages with the same name are summed up
+        """
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            total, calls = self.timers.get(name, (0.0, 0))
+            self.timers[name] = (total + seconds, calls + 1)
+
+    def count(self, name, n=1) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def set(self, name, value) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = value
+
+    @contextmanager
+    def capture(self, name, top=25):
+        """
+        Capture cProfile and tracemalloc statistics of the block if they are turned on.
+        cProfile only sees the thread the block runs in.
+        """
+        if not (self.cprofile or self.memory):
+            yield
+            return
+        import cProfile
+        import pstats
+        import tracemalloc
+
+        profile = cProfile.Profile() if self.cprofile else None
+        started_tracemalloc = self.memory and not tracemalloc.is_tracing()
+        if started_tracemalloc:
+            tracemalloc.start()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield
+        finally:
+            capture = {}
+            if profile is not None:
+                profile.disable()
+                stream = io.StringIO()
+                pstats.Stats(profile, stream=stream).sort_stats('cumulative').print_stats(top)
+                capture['cprofile'] = stream.getvalue()
+            if self.memory:
+                current, peak = tracemalloc.get_traced_memory()
+                snapshot = tracemalloc.take_snapshot()
+                capture['memory'] = {
+                    'current_bytes': current, 
+                    'peak_bytes': peak,
+                    'top': [str(stat) for stat in snapshot.statistics('lineno')[:top]]
+                }
+                if started_tracemalloc:
+                    tracemalloc.stop()
+            with self._lock:
+                self.captures[name] = capture
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                'timers': {name: {'seconds': total, 'calls': calls} for name, (total, calls) in self.timers.items()},
+                'counters': dict(self.counters),
+                'captures': dict(self.captures)
+            }
+
+    def to_json(self, path=None) -> str:
+        """
+        Export collected statistics as JSON, also write it to file if path is given
+        """
+        text = json.dumps(self.to_dict(), indent=4, default=float)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(text)
+        return text
+
+    def summary(self) -> str:
+        with self._lock:
+            lines = [f'{name}: {total:.4f} s ({calls} calls)' for name, (total, calls) in self.timers.items()]
+            lines += [f'{name}: {value}' for name, value in self.counters.items()]
+        return '\n'.join(lines)
+
+# Profiler used by default, it collects nothing
+NO_PROFILER = Profiler(enabled=False)
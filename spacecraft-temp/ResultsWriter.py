@@ -0,0 +1,119 @@
+import queue
+import struct
+import threading
+import numpy as np
+
+# Size of .npy header, it is padded to fixed size so that the shape can be updated in place
+NPY_HEADER_SIZE = 128
+
+def _npy_header(n_rows, n_cols) -> bytes:
+    header = "{'descr': '<f8', 'fortran_order': False, 'shape': (%d, %d), }" % (n_rows, n_cols)
+    header = header.ljust(NPY_HEADER_SIZE - 10 - 1) + '\n'
+    return b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + header.encode('latin1')
+
+class ResultsWriter:
+    """
+    Sink of calculation results owning the output file for the whole run.
+    Chunks are written by a background thread, rows are t and temperatures of all FE.
+    Supported formats:
+        'csv' - text table with header, t rounded to 2 and temperatures to 3 decimals
+        'npy' - append-only float64 array of shape (n_rows, n_obj + 1) at full precision, 
+                can be read back with np.load(path, mmap_mode='r')
+    """
+
+    def __init__(self, path, n_elem, file_format=None) -> None:
+        """
+        Args:
+            path (string): path to output file, it is overwritten
+            n_elem (int): count of FE
+            file_format (string, optional): 'csv' or 'npy'. Defaults to the extension of path.
+        """
+        self.path = path
+        self.n_elem = n_elem
+        self.file_format = self.results_format(path, file_format)
+
+        self.n_rows = 0
+        self.bytes_written = 0
+        self._error = None
+        self._queue = queue.Queue()
+        self._file = open(path, 'w' if self.file_format == 'csv' else 'wb')
+        self._write_header()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def results_format(path, file_format=None) -> str:
+        """
+        Format of results written to given path, so that it can be checked before the calculation
+
+        Raises:
+            ValueError: if the format is not supported
+        """
+        file_format = file_format if file_format is not None else str(path).rsplit('.', 1)[-1].lower()
+        if file_format not in ('csv', 'npy'):
+            raise ValueError(f'Unsupported results format: {file_format}')
+        return file_format
+
+    def _write_header(self):
+        if self.file_format == 'csv':
+            header = ','.join(['t'] + [f'T{idx + 1}' for idx in range(self.n_elem)]) + '\n'
+            self._file.write(header)
+            self.bytes_written += len(header)
+        else:
+            self._file.write(_npy_header(0, self.n_elem + 1))
+            self.bytes_written += NPY_HEADER_SIZE
+
+    def write(self, t, y):
+        """
+        Queue chunk of results for writing
+
+        Args:
+            t (np.array of shape (n,)): time grid
+            y (np.array of shape (n, n_obj)): temperatures of FE
+        """
+        if self._error is not None:
+            raise self._error
+        self._queue.put(np.column_stack((t, y)))
+
+    def _run(self):
+        while True:
+            rows = self._queue.get()
+            if rows is None:
+                break
+            try:
+                self._write_rows(rows)
+            except Exception as e:
+                self._error = e
+
+    def _write_rows(self, rows):
+        if self.file_format == 'csv':
+            fmt = ','.join(['%.2f'] + ['%.3f'] * self.n_elem)
+            text = '\n'.join(fmt % tuple(row) for row in rows) + '\n'
+            self._file.write(text)
+            self.bytes_written += len(text)
+        else:
+            data = np.ascontiguousarray(rows, dtype='<f8').tobytes()
+            self._file.write(data)
+            self.bytes_written += len(data)
+        self.n_rows += rows.shape[0]
+        if self.file_format == 'npy':
+            # keep the file readable while the run goes on
+            self._file.seek(0)
+            self._file.write(_npy_header(self.n_rows, self.n_elem + 1))
+            self._file.seek(0, 2)
+
+    def close(self):
+        """
+        Write all queued chunks and close the file
+        """
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,96 @@
+import threading
+from PyQt6.QtCore import QObject, pyqtSignal
+from IntegratorSession import *
+from ResultsWriter import *
+from Profiler import *
+
+class SolverWorker(QObject):
+    """
+    Integrates the heat balance equation in a background thread and streams results by chunks
+    """
+    chunk_ready = pyqtSignal(object, object)
+    error = pyqtSignal(str)
+    finished = pyqtSignal()
+
+    def __init__(self, fe_model, t_max, init_value_mode='config', a=50, t_step=100, n_points=100, 
+                 max_pending_chunks=2, results_writer=None, profiler=NO_PROFILER) -> None:
+        """
+        Args:
+            fe_model (FiniteElementModel): model to integrate
+            t_max (float): time to integrate to, np.inf for infinite runs
+            init_value_mode (string, optional): 'config' to start from t0 of the model, 
+                'steady' to start from the steady solution. Defaults to 'config'.
+            a (float, optional): value of A in heat flux expressions. Defaults to 50.
+            t_step (float, optional): length of chunks in time units. Defaults to 100.
+            n_points (int, optional): number of points in every chunk. Defaults to 100.
+            max_pending_chunks (int, optional): number of chunks the worker may be ahead of the GUI. Defaults to 2.
+            results_writer (ResultsWriter, optional): sink for all results, closed when the run ends. Defaults to None.
+            profiler (Profiler, optional): collector of timers and counters of the run. Defaults to disabled one.
+        """
+        super().__init__()
+        self.fe_model = fe_model
+        self.t_max = t_max
+        self.init_value_mode = init_value_mode
+        self.a = a
+        self.t_step = t_step
+        self.n_points = n_points
+        self.cancelled = threading.Event()
+        self.pending_chunks = threading.Semaphore(max_pending_chunks)
+        self.results_writer = results_writer
+        self.profiler = profiler
+
+    def cancel(self):
+        # called from the GUI thread, the worker checks the token between solver steps
+        self.cancelled.set()
+
+    def chunk_consumed(self):
+        # called from the GUI thread when the chunk is drawn
+        self.pending_chunks.release()
+
+    def _wait_for_consumer(self) -> bool:
+        while not self.pending_chunks.acquire(timeout=0.05):
+            if self.cancelled.is_set():
+                return False
+        return True
+
+    def run(self):
+        try:
+            with self.profiler.capture('run'):
+                self._integrate()
+        except Exception as e:
+            self.error.emit(str(e))
+        try:
+            if self.results_writer is not None:
+                with self.profiler.stage('writer_close'):
+                    self.results_writer.close()
+                self.profiler.set('rows_written', self.results_writer.n_rows)
+                self.profiler.set('bytes_written', self.results_writer.bytes_written)
+        except Exception as e:
+            self.error.emit(f'Results are not saved: {e}')
+        self.finished.emit()
+
+    def _integrate(self):
+        profiler = self.profiler
+        with profiler.stage('setup'):
+            hbe = HeatBalanceEquation(self.fe_model)
+            y0 = self.fe_model.t0 if self.init_value_mode == 'config' else hbe.steady_solution(self.a)
+            session = IntegratorSession(hbe, y0, a=self.a)
+        try:
+            chunks = session.chunks(self.t_step, self.n_points, self.t_max, self.cancelled)
+            while True:
+                with profiler.stage('integration'):
+                    t, y = next(chunks, (None, None))
+                if t is None:
+                    break
+                if t.shape[0] == 0:
+                    continue
+                profiler.count('chunks')
+                if self.results_writer is not None:
+                    self.results_writer.write(t, y)
+                with profiler.stage('waiting_for_gui'):
+                    consumed = self._wait_for_consumer()
+                if consumed:
+                    self.chunk_ready.emit(t, y)
+        finally:
+            for name, value in session.statistics().items():
+                profiler.set(name, value)
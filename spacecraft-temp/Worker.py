@@ -1,14 +1,18 @@
 from PyQt6.QtCore import QObject, QThread, pyqtSignal
 from ObjParser import *
+from GeometryCache import *
 
 class Worker(QObject):
     finished = pyqtSignal()
 
-    def __init__(self, fe_model, path) -> None:
+    def __init__(self, fe_model, path, profiler=NO_PROFILER) -> None:
         super().__init__()
         self.fe_model = fe_model
         self.path = path
+        self.profiler = profiler
 
     def run(self):
-        self.fe_model = ObjFileParser.parse_obj_to_finite_element_model(self.path, log_to_console=True)
+        self.fe_model = ObjFileParser.parse_obj_to_finite_element_model(self.path, log_to_console=True, 
+                                                                        cache=GeometryCache(), 
+                                                                        profiler=self.profiler)
         self.finished.emit()
@@ -0,0 +1,5 @@
+import sys
+from cli import main
+
+# allows to run the directory itself: python spacecraft-temp <command>
+sys.exit(main())
@@ -0,0 +1,155 @@
+import sys
+import argparse
+from pathlib import Path
+
+# Heavy modules (SciPy solvers, matplotlib, Qt) are imported inside commands which need them,
+# so that headless commands start fast
+
+DEFAULT_MODEL = str(Path(__file__).parent / 'model2.obj')
+
+def make_profiler(args):
+    from Profiler import Profiler, NO_PROFILER
+
+    if args.profile is None:
+        return NO_PROFILER
+    return Profiler(cprofile=args.profile_capture, memory=args.profile_capture)
+
+def save_profile(profiler, args):
+    if profiler.enabled:
+        profiler.to_json(args.profile)
+        print(f"Profile is written to {args.profile}", file=sys.stderr)
+
+def parse_command(args):
+    from ObjParser import ObjFileParser
+    from GeometryCache import GeometryCache
+
+    profiler = make_profiler(args)
+    cache = None if args.no_cache else GeometryCache()
+    with profiler.capture('parse'):
+        fe_model = ObjFileParser.parse_obj_to_finite_element_model(args.model, cache=cache, profiler=profiler)
+    print(f"Elements: {fe_model.n_elem}")
+    for idx in range(fe_model.n_elem):
+        name = fe_model.part_names[idx] if fe_model.part_names is not None else idx + 1
+        print(f"{name}: full surface {fe_model.full_surfaces[idx]:.6g}, free surface {fe_model.surfaces[idx]:.6g}")
+    contacts = fe_model.intersection_matrix.tocoo()
+    for i, j, area in zip(contacts.row, contacts.col, contacts.data):
+        if i < j:
+            print(f"Contact {i + 1} - {j + 1}: {area:.6g}")
+    save_profile(profiler, args)
+    return 0
+
+def solve_command(args):
+    import numpy as np
+    from ObjParser import ObjFileParser
+    from GeometryCache import GeometryCache
+    from HeatBalanceEquation import HeatBalanceEquation
+    from ResultsWriter import ResultsWriter
+
+    # a wrong output format is reported before the calculation rather than after it
+    try:
+        ResultsWriter.results_format(args.out)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    profiler = make_profiler(args)
+    cache = None if args.no_cache else GeometryCache()
+    with profiler.capture('solve'):
+        fe_model = ObjFileParser.parse_obj_to_finite_element_model(args.model, cache=cache, profiler=profiler)
+        fe_model.read_params_from_file(args.params)
+        with profiler.stage('setup'):
+            hbe = HeatBalanceEquation(fe_model)
+            try:
+                y0 = fe_model.t0 if args.init == 'config' else hbe.steady_solution(args.a)
+            except RuntimeError as e:
+                print(f"Calculation failed: {e}", file=sys.stderr)
+                return 1
+        with profiler.stage('integration'):
+            sol = hbe.solve(t_span=[0, args.t], y0=y0, a=args.a, method=args.method, dense_output=True)
+        if not sol.success:
+            print(f"Calculation failed: {sol.message}", file=sys.stderr)
+            return 1
+        # with dense output and no t_eval the solution keeps every accepted step
+        profiler.set('accepted_steps', sol.t.shape[0] - 1)
+        profiler.set('rhs_calls', sol.nfev)
+        profiler.set('jacobian_calls', sol.njev)
+        profiler.set('lu_decompositions', sol.nlu)
+        t = np.linspace(0, args.t, args.points)
+        with profiler.stage('write'):
+            with ResultsWriter(args.out, fe_model.n_elem) as writer:
+                writer.write(t, sol.sol(t).T)
+        profiler.set('bytes_written', writer.bytes_written)
+    print(f"{args.points} points are written to {args.out}")
+    save_profile(profiler, args)
+    return 0
+
+def batch_command(args):
+    from BatchRunner import main
+    return main(args.batch_args)
+
+def cache_command(args):
+    from GeometryCache import GeometryCache
+
+    cache = GeometryCache()
+    if args.action == 'clear':
+        cache.clear()
+        print(f"Cache {cache.cache_dir} is cleared")
+        return 0
+    entries = cache.entries()
+    for key, size, _ in entries:
+        print(f"{key} {size} B")
+    print(f"{len(entries)} entries, {cache.size()} of {cache.max_size} B in {cache.cache_dir}")
+    return 0
+
+def gui_command(args):
+    from PyQt6.QtWidgets import QApplication
+    from MainWindow import MainWindow
+
+    app = QApplication(sys.argv[:1])
+    window = MainWindow()
+    window.show()
+    return app.exec()
+
+def add_profile_arguments(command):
+    command.add_argument('--profile', metavar='JSON', help='write timers and counters of the run to json-file')
+    command.add_argument('--profile-capture', action='store_true', 
+                         help='also capture cProfile and tracemalloc statistics into the profile')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='spacecraft-temp', description='Spacecraft temperature distribution')
+    commands = parser.add_subparsers(dest='command')
+
+    parse = commands.add_parser('parse', help='parse .obj model and print its geometry')
+    parse.add_argument('model', help='path to .obj model file')
+    parse.add_argument('--no-cache', action='store_true', help='do not use cache of parsed models')
+    add_profile_arguments(parse)
+    parse.set_defaults(handler=parse_command)
+
+    solve = commands.add_parser('solve', help='solve the heat balance equation')
+    solve.add_argument('--model', default=DEFAULT_MODEL, help='path to .obj model file')
+    solve.add_argument('--params', required=True, help='path to json-file with parameters')
+    solve.add_argument('--t', type=float, required=True, help='calculation time')
+    solve.add_argument('--out', default='results.csv', help='output file, .csv or .npy')
+    solve.add_argument('--points', type=int, default=100, help='number of points in results')
+    solve.add_argument('--a', type=float, default=50, help='value of A in heat flux expressions')
+    solve.add_argument('--init', choices=['config', 'steady'], default='config', help='initial values')
+    solve.add_argument('--method', choices=['BDF', 'Radau', 'RK45'], default='BDF', help='integration method')
+    solve.add_argument('--no-cache', action='store_true', help='do not use cache of parsed models')
+    add_profile_arguments(solve)
+    solve.set_defaults(handler=solve_command)
+
+    batch = commands.add_parser('batch', help='run a sweep of parameters, see BatchRunner.py -h', add_help=False)
+    batch.add_argument('batch_args', nargs=argparse.REMAINDER)
+    batch.set_defaults(handler=batch_command)
+
+    cache = commands.add_parser('cache', help='inspect or clear cache of parsed models')
+    cache.add_argument('action', choices=['info', 'clear'], nargs='?', default='info')
+    cache.set_defaults(handler=cache_command)
+
+    gui = commands.add_parser('gui', help='start graphical interface')
+    gui.set_defaults(handler=gui_command)
+
+    args = parser.parse_args(argv)
+    if args.command is None:
+        return gui_command(args)
+    return args.handler(args)
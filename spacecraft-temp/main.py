@@ -1,14 +1,10 @@
 import sys
-from utils import *
-from MainWindow import *
-from PyQt6.QtWidgets import QApplication
+from cli import main
 
 # ------ BEGIN MAIN ------
 
-# start application
-app = QApplication(sys.argv)
-window = MainWindow()
-window.show()
-app.exec()
+# start application, graphical interface is started if no command is given
+if __name__ == '__main__':
+    sys.exit(main())
 
 # ------ END MAIN ------
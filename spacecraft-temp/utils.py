@@ -1,84 +1,264 @@
+import re
 import numpy as np
+from array import array
+from scipy import sparse
 
-def replace_g_with_o(input_file, output_file):
-    with open(input_file, 'r') as file:
-        obj_content = file.read()
-
-    # Replace 'g' with 'o' in the OBJ content
-    modified_content = obj_content.replace('g ', 'o ')
-
-    with open(output_file, 'w') as file:
-        file.write(modified_content)
-
-def area_of_triangle(v1, v2, v3):
-    return 0.5 * np.linalg.norm(np.cross(v2 - v1, v3 - v1))
-
-def is_triangle_aligned_with_axs(triangle):
-    vertex = triangle[0].reshape(1,3)
-    return np.all((triangle == vertex), axis=0)
-
-
-def axes_of_triangles_overlap(triangle1, triangle2):
-    axs1 = is_triangle_aligned_with_axs(triangle1)
-    if not np.any(axs1): return None
-
-    axs2 = is_triangle_aligned_with_axs(triangle2)
-    if not np.any(axs2): return None
-
-    if np.any(axs1 == axs2) and np.all(triangle1[:, axs1] == triangle2[:, axs2]):
-        return np.argmax(axs1), triangle1[:, axs1][0][0]
-    else: 
-        return None  # Triangles do not overlap
-    
-def find_common_axis_value(obj1_vertices, obj1_faces, obj2_vertices, obj2_faces):
-    for face1 in obj1_faces:
-        for face2 in obj2_faces:
-            # Extract vertices of the triangles
-            tri1 = np.array((
-                    np.array(obj1_vertices[face1[0]]), 
-                    np.array(obj1_vertices[face1[1]]), 
-                    np.array(obj1_vertices[face1[2]])))
-            tri2 = np.array((
-                    np.array(obj2_vertices[face2[0]]), 
-                    np.array(obj2_vertices[face2[1]]), 
-                    np.array(obj2_vertices[face2[2]])))
-            
-            ax = axes_of_triangles_overlap(tri1, tri2)
-
-            if ax is not None:
-                    return ax
-    return None
-
-def calculate_surface_area(vertices, faces):
-    total_area = 0.0
-
-    for face in faces:
-        p1 = np.array(vertices[face[0]])
-        p2 = np.array(vertices[face[1]])
-        p3 = np.array(vertices[face[2]])
-
-        area = area_of_triangle(p1, p2, p3)
-        total_area += area
-
-    return total_area
-
-def calculate_intersection_area(obj1_vertices, obj1_faces, obj2_vertices, obj2_faces):
-    intersection_area = 0.0
-
-    ax = find_common_axis_value(obj1_vertices, obj1_faces, obj2_vertices, obj2_faces)
-
-    if ax is not None:
-        for face1 in obj1_faces:
-            tri1 = np.array((
-                        np.array(obj1_vertices[face1[0]]), 
-                        np.array(obj1_vertices[face1[1]]), 
-                        np.array(obj1_vertices[face1[2]])))
-            if (np.all(tri1[:, ax[0]] == ax[1])):
-                intersection_area += area_of_triangle(*tri1)
-
-    return intersection_area
-
-def string_to_function(expression, a=1):
-    def function(t, A=a):
-        return eval(expression)
-    return function
\ No newline at end of file
+OBJ_CHUNK_SIZE = 16 * 1024 ** 2
+
+def _read_lines(file, chunk_size):
+    # Read file by fixed size chunks and split them into lines
+    tail = b''
+    for chunk in iter(lambda: file.read(chunk_size), b''):
+        lines = (tail + chunk).split(b'\n')
+        tail = lines.pop()
+        yield from lines
+    if tail:
+        yield tail
+
+def read_obj(path, chunk_size=OBJ_CHUNK_SIZE):
+    """
+    Read vertices and faces of all parts of .obj file in a single pass without modifying the file.
+    Both 'o' and 'g' statements start a part, polygons are split into triangles.
+
+    Args:
+        path (string): path to .obj file
+        chunk_size (int, optional): size of chunks the file is read by. Defaults to 16 MB.
+
+    Returns:
+        np.array of shape (n_vert, 3), dtype float64: vertex coordinates
+        list of strings: names of parts in order of their appearance, None for faces outside of any part
+        list of np.array of shape (n_faces_i, 3), dtype int32: vertex indices of faces of every part
+    """
+    vertices = array('d')
+    part_faces = {}
+    faces = None
+    n_vert = 0
+
+    with open(path, 'rb') as file:
+        for line in _read_lines(file, chunk_size):
+            tokens = line.split()
+            if not tokens:
+                continue
+            statement = tokens[0]
+            if statement == b'v':
+                vertices.extend(map(float, tokens[1:4]))
+                n_vert += 1
+            elif statement == b'f':
+                if faces is None:
+                    faces = part_faces.setdefault(None, array('i'))
+                indices = [int(token.split(b'/', 1)[0]) for token in tokens[1:]]
+                # OBJ indices start from 1, negative ones are relative to the last vertex
+                indices = [idx - 1 if idx > 0 else n_vert + idx for idx in indices]
+                for k in range(1, len(indices) - 1):
+                    faces.extend((indices[0], indices[k], indices[k + 1]))
+            elif statement in (b'o', b'g'):
+                name = line.strip()[1:].strip().decode()
+                faces = part_faces.setdefault(name, array('i'))
+
+    part_names = [name for name, faces in part_faces.items() if len(faces) > 0]
+    vertex_array = np.frombuffer(vertices, dtype=np.float64).reshape(-1, 3)
+    face_arrays = [np.frombuffer(part_faces[name], dtype=np.int32).reshape(-1, 3) for name in part_names]
+    return vertex_array, part_names, face_arrays
+
+def mesh_to_arrays(part_faces):
+    """
+    Join faces of all parts into one contiguous array
+
+    Args:
+        part_faces (list of np.array of shape (n_faces_i, 3)): vertex indices of faces of every part
+
+    Returns:
+        np.array of shape (n_faces, 3), dtype int32: vertex indices of all faces, grouped by part
+        np.array of shape (n_obj + 1,), dtype int64: bounds of every part in the face array
+    """
+    face_array = np.ascontiguousarray(np.concatenate(part_faces), dtype=np.int32)
+    part_bounds = np.cumsum([0] + [faces.shape[0] for faces in part_faces])
+    return face_array, part_bounds
+
+def triangle_areas(vertices, faces):
+    triangles = vertices[faces]
+    return 0.5 * np.linalg.norm(np.cross(triangles[:, 1] - triangles[:, 0], 
+                                         triangles[:, 2] - triangles[:, 0]), axis=1)
+
+def axis_aligned_planes(vertices, faces):
+    """
+    Find the axis-aligned plane every triangle lies in
+
+    Returns:
+        np.array of shape (n_faces,): index of the axis the triangle is orthogonal to, -1 if there is none
+        np.array of shape (n_faces,): coordinate of the plane along that axis
+    """
+    triangles = vertices[faces]
+    aligned = np.all(triangles == triangles[:, :1, :], axis=1)
+    axes = np.where(np.any(aligned, axis=1), np.argmax(aligned, axis=1), -1)
+    values = triangles[np.arange(faces.shape[0]), 0, np.maximum(axes, 0)]
+    return axes, values
+
+def calculate_surface_areas(face_areas, part_bounds):
+    starts = part_bounds[:-1]
+    non_empty = starts < part_bounds[1:]
+    surfaces = np.zeros(starts.shape[0])
+    if np.any(non_empty):
+        surfaces[non_empty] = np.add.reduceat(face_areas, starts[non_empty])
+    return surfaces
+
+def part_sort_key(name):
+    """
+    Key for natural ordering of part names, so that 'Part10' goes after 'Part9'
+    """
+    return [int(token) if token.isdigit() else token for token in re.split(r'(\d+)', name or '')]
+
+def triangle_bounds(vertices, faces):
+    """
+    Axis-aligned bounding boxes of triangles
+
+    Returns:
+        np.array of shape (n_faces, 3): lower corners of boxes
+        np.array of shape (n_faces, 3): upper corners of boxes
+    """
+    triangles = vertices[faces]
+    return triangles.min(axis=1), triangles.max(axis=1)
+
+def build_contact_index(face_areas, face_axes, face_values, face_lower, face_upper, part_bounds):
+    """
+    Bucket axis-aligned triangles by the plane they lie in
+
+    Args:
+        face_areas (np.array of shape (n_faces,)): areas of all faces
+        face_axes (np.array of shape (n_faces,)): axis each face is orthogonal to, -1 if there is none
+        face_values (np.array of shape (n_faces,)): coordinate of the plane along that axis
+        face_lower (np.array of shape (n_faces, 3)): lower corners of bounding boxes of faces
+        face_upper (np.array of shape (n_faces, 3)): upper corners of bounding boxes of faces
+        part_bounds (np.array of shape (n_obj + 1,)): bounds of every part in the face arrays
+
+    Returns:
+        dict: (axis, plane coordinate) -> {part index: (area of the part on this plane, 
+            lower and upper corners of its bounding rectangle on this plane)}
+    """
+    part_ids = np.repeat(np.arange(part_bounds.shape[0] - 1), np.diff(part_bounds))
+    aligned = face_axes >= 0
+
+    # Sum the areas of all faces sharing the same (axis, plane coordinate, part) key
+    keys = np.column_stack((face_axes[aligned], face_values[aligned], part_ids[aligned]))
+    keys, inverse = np.unique(keys, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    areas = np.bincount(inverse, weights=face_areas[aligned], minlength=keys.shape[0])
+
+    # Bounding rectangle of the faces of every key
+    lower = np.full((keys.shape[0], 3), np.inf)
+    upper = np.full((keys.shape[0], 3), -np.inf)
+    np.minimum.at(lower, inverse, face_lower[aligned])
+    np.maximum.at(upper, inverse, face_upper[aligned])
+
+    index = {}
+    for (axis, value, part), area, part_lower, part_upper in zip(keys, areas, lower, upper):
+        index.setdefault((int(axis), value), {})[int(part)] = (area, part_lower, part_upper)
+    return index
+
+def calculate_intersection_matrix(contact_index, n_obj):
+    """
+    Find every pair of parts touching each other and the area of their contact
+
+    Parts touch when they both have faces in the same axis-aligned plane and their bounding rectangles 
+    on that plane overlap. The contact area on that plane is the smallest of the two part areas on it 
+    and the area of the overlap of the rectangles.
+
+    Returns:
+        scipy.sparse.csr_matrix of shape (n_obj, n_obj): matrix of contact areas
+    """
+    rows, cols, areas = [], [], []
+
+    for (axis, _), parts in contact_index.items():
+        if len(parts) < 2:
+            continue
+        in_plane = [dim for dim in range(3) if dim != axis]
+        items = list(parts.items())
+        for k, (obj_idx, (obj_area, obj_lower, obj_upper)) in enumerate(items):
+            for other_obj_idx, (other_obj_area, other_lower, other_upper) in items[k + 1:]:
+                overlap = (np.minimum(obj_upper, other_upper) - np.maximum(obj_lower, other_lower))[in_plane]
+                # parts side by side on the same plane or touching only by an edge are not in contact
+                if np.any(overlap <= 0):
+                    continue
+                area = min(obj_area, other_obj_area, overlap.prod())
+                rows += [obj_idx, other_obj_idx]
+                cols += [other_obj_idx, obj_idx]
+                areas += [area, area]
+
+    # contacts of the same pair on different planes are summed up
+    return sparse.coo_matrix((areas, (rows, cols)), shape=(n_obj, n_obj)).tocsr()
+
+def _compile_flux_expressions(expressions, a):
+    # Parse expressions once, fluxes which do not depend on time are evaluated right away.
+    # Constant fluxes have shape np.shape(a) + (n_obj,), all time dependent fluxes are
+    # evaluated by a single compiled function returning the tuple of their values
+    namespace = {'np': np, 'A': a}
+    constant_fluxes = np.zeros(np.shape(a) + (len(expressions),))
+    variable_idx = []
+    variable_expressions = []
+
+    for idx, expression in enumerate(expressions):
+        expression = str(expression)
+        code = compile(expression, '<heat flux>', 'eval')
+        if 't' in code.co_names:
+            variable_idx.append(idx)
+            variable_expressions.append(f'({expression})')
+        else:
+            constant_fluxes[..., idx] = eval(code, namespace)
+
+    evaluate = eval(compile('lambda t: (' + ', '.join(variable_expressions) + ',)', '<heat fluxes>', 'eval'), 
+                    namespace) if variable_expressions else None
+    return constant_fluxes, np.array(variable_idx, dtype=int), evaluate
+
+def compile_heat_fluxes(expressions, a=1):
+    """
+    Compile heat flux expressions of all FE into one function of time.
+    Expressions are parsed once, fluxes which do not depend on time are evaluated right away.
+
+    Args:
+        expressions (list of strings): python expressions of t and A, numpy is available as np
+        a (float, optional): value of A in expressions. Defaults to 1.
+
+    Returns:
+        function: t -> np.array of shape (n_obj,) + np.shape(t) with heat fluxes of all FE
+    """
+    constant_fluxes, variable_idx, evaluate = _compile_flux_expressions(expressions, a)
+
+    def fluxes(t):
+        if np.ndim(t) == 0:
+            q = constant_fluxes.copy()
+            if evaluate is not None:
+                q[variable_idx] = evaluate(t)
+            return q
+
+        q = np.empty(constant_fluxes.shape + np.shape(t))
+        q[...] = constant_fluxes.reshape((-1,) + (1,) * np.ndim(t))
+        if evaluate is not None:
+            for idx, value in zip(variable_idx, evaluate(t)):
+                q[idx] = value
+        return q
+
+    return fluxes
+
+def compile_ensemble_heat_fluxes(expressions, a):
+    """
+    Compile heat flux expressions of all FE into one function of time for an ensemble of 
+    models differing in the value of A, expressions are evaluated for all members at once
+
+    Args:
+        expressions (list of strings): python expressions of t and A, numpy is available as np
+        a (np.array of shape (n_members,)): values of A of ensemble members
+
+    Returns:
+        function: t -> np.array of shape (n_members, n_obj) with heat fluxes of all FE of every member
+    """
+    a = np.asarray(a, dtype=np.float64)
+    constant_fluxes, variable_idx, evaluate = _compile_flux_expressions(expressions, a)
+
+    def fluxes(t):
+        q = constant_fluxes.copy()
+        if evaluate is not None:
+            for idx, value in zip(variable_idx, evaluate(t)):
+                q[:, idx] = value
+        return q
+
+    return fluxes